@@ -22,27 +22,76 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app, origins="*")
 
-# Import services (we'll create these next)
-from services.prediction_service import PredictionService
-from services.training_service import TrainingService
-from services.data_service import DataService
-from utils.scheduler import start_scheduler
+from utils.memory import STAGE_REPORT, current_rss_mb, memory_budget_mb, peak_rss_mb
 
-# Initialize services
-try:
-    prediction_service = PredictionService()
-    training_service = TrainingService()
-    data_service = DataService()
-    logger.info("All services initialized successfully")
-except Exception as e:
-    logger.error(f"Failed to initialize services: {e}")
-    prediction_service = None
-    training_service = None
-    data_service = None
+# Services are created by init_services() rather than at import time:
+# stockout simulator workers are spawned processes that re-import this
+# module as __mp_main__ and must not rebuild models or start schedulers.
+prediction_service = None
+training_service = None
+data_service = None
+stockout_simulator = None
+lead_time_service = None
+snapshot_service = None
+product_ranking = None
+retrain_scheduler = None
+_services_initialized = False
 
-# Start automated retraining scheduler
-if os.getenv('ENABLE_AUTO_RETRAIN', 'false').lower() == 'true':
-    start_scheduler(training_service)
+def init_services():
+    """Initialize services and start background schedulers (once per server process)"""
+    global prediction_service, training_service, data_service, stockout_simulator
+    global lead_time_service, snapshot_service, product_ranking, retrain_scheduler
+    global _services_initialized
+    
+    if _services_initialized:
+        return
+    _services_initialized = True
+    
+    # Import services (we'll create these next)
+    from services.prediction_service import PredictionService
+    from services.training_service import TrainingService
+    from services.data_service import DataService
+    from services.stockout_simulator import StockoutSimulator
+    from services.snapshot_service import SnapshotService
+    from services.product_ranking_service import ProductRankingIndex
+    from utils.scheduler import start_scheduler, start_snapshot_scheduler, start_lead_time_scheduler
+    
+    # Initialize services
+    try:
+        prediction_service = PredictionService()
+        training_service = TrainingService()
+        data_service = DataService()
+        stockout_simulator = StockoutSimulator()
+        # Shared so refreshed distributions feed the simulator's lead times
+        lead_time_service = stockout_simulator.lead_time_service
+        snapshot_service = SnapshotService()
+        product_ranking = ProductRankingIndex()
+        logger.info("All services initialized successfully")
+    except Exception as e:
+        logger.error(f"Failed to initialize services: {e}")
+        prediction_service = None
+        training_service = None
+        data_service = None
+        stockout_simulator = None
+        lead_time_service = None
+        snapshot_service = None
+        product_ranking = None
+    
+    # Start automated retraining scheduler
+    if os.getenv('ENABLE_AUTO_RETRAIN', 'false').lower() == 'true':
+        retrain_scheduler = start_scheduler(training_service, data_service)
+    
+    # Keep Parquet snapshots fresh for the embedded analytics engine
+    if os.getenv('ENABLE_SNAPSHOTS', 'false').lower() == 'true':
+        start_snapshot_scheduler(snapshot_service)
+    
+    # Fold new purchase order receipts into the lead-time distributions
+    start_lead_time_scheduler(lead_time_service)
+
+def create_app():
+    """WSGI entry point, e.g. gunicorn 'app:create_app()'"""
+    init_services()
+    return app
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -63,7 +112,9 @@ def predict():
     {
         "days": 7,  # Number of days to predict
         "model": "ensemble",  # Model type: arima, lstm, or ensemble
-        "include_confidence": true  # Include confidence intervals
+        "include_confidence": true,  # Include confidence intervals
+        "granularity": "daily",  # daily, or hourly (Fourier model, 24h/168h seasonality)
+        "hours": 48  # Number of hours to predict when granularity is hourly
     }
     """
     try:
@@ -71,6 +122,7 @@ def predict():
         days_ahead = data.get('days', 7)
         model_type = data.get('model', 'ensemble')
         include_confidence = data.get('include_confidence', True)
+        granularity = data.get('granularity', 'daily')
         
         logger.info(f"Prediction request: {days_ahead} days using {model_type} model")
         
@@ -80,6 +132,27 @@ def predict():
                 'error': 'Prediction service not available'
             }), 503
         
+        if granularity == 'hourly':
+            hours_ahead = data.get('hours', 24)
+            logger.info(f"Hourly prediction request: {hours_ahead} hours")
+            predictions = prediction_service.predict_hourly(hours_ahead=hours_ahead)
+            revenues = [p['revenue'] for p in predictions]
+            
+            return jsonify({
+                'success': True,
+                'predictions': predictions,
+                'model': 'fourier_hourly',
+                'granularity': 'hourly',
+                'hours_ahead': hours_ahead,
+                'generated_at': datetime.now().isoformat(),
+                'metrics': {
+                    'total_predicted_revenue': sum(revenues),
+                    'average_hourly_revenue': np.mean(revenues),
+                    'peak_hour': max(predictions, key=lambda p: p['revenue'])['timestamp'],
+                    'trend': 'increasing' if revenues[-1] > revenues[0] else 'decreasing'
+                }
+            })
+        
         # Generate predictions
         predictions = prediction_service.predict(
             days_ahead=days_ahead,
@@ -314,6 +387,359 @@ def detect_anomalies():
             'error': str(e)
         }), 500
 
+@app.route('/api/v1/ml/inventory/stockout-risk', methods=['POST'])
+def stockout_risk():
+    """
+    Simulate stockout risk for the whole catalog
+    
+    Request body (optional):
+    {
+        "paths": 20000,  # Demand paths per SKU
+        "horizon_days": 60,  # Days to simulate
+        "history_days": 90,  # Sales history used to estimate demand
+        "forecasts": {"<product_id>": 4.2},  # Mean daily units overriding history
+        "seed": 42  # Seed for reproducible runs
+    }
+    """
+    try:
+        data = request.json or {}
+        
+        if not stockout_simulator:
+            return jsonify({
+                'success': False,
+                'error': 'Stockout simulator not available'
+            }), 503
+        
+        results = stockout_simulator.run(
+            n_paths=data.get('paths'),
+            horizon_days=data.get('horizon_days'),
+            history_days=data.get('history_days', 90),
+            forecasts=data.get('forecasts'),
+            seed=data.get('seed')
+        )
+        
+        at_risk = [r for r in results if r['stockout_risk'] in ('critical', 'high')]
+        
+        return jsonify({
+            'success': True,
+            'products': results,
+            'total': len(results),
+            'at_risk': len(at_risk),
+            'generated_at': datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        logger.error(f"Stockout simulation error: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/v1/ml/suppliers/lead-times', methods=['GET'])
+def get_lead_times():
+    """
+    Get fitted supplier lead-time and fill-rate distributions
+    
+    Query params:
+        supplier_id: Return a single supplier (or supplier-product) distribution
+        product_id: Narrow to a supplier-product pair
+        level: supplier or supplier_product when listing all (default supplier)
+    """
+    try:
+        if not lead_time_service:
+            return jsonify({
+                'success': False,
+                'error': 'Lead-time service not available'
+            }), 503
+        
+        supplier_id = request.args.get('supplier_id')
+        if supplier_id:
+            distribution = lead_time_service.get_distribution(
+                supplier_id, request.args.get('product_id')
+            )
+            return jsonify({
+                'success': True,
+                'distribution': distribution
+            })
+        
+        level = request.args.get('level', 'supplier')
+        if level not in ('supplier', 'supplier_product'):
+            return jsonify({
+                'success': False,
+                'error': f'Unknown level: {level}'
+            }), 400
+        
+        distributions = lead_time_service.get_all_distributions(level)
+        return jsonify({
+            'success': True,
+            'distributions': distributions,
+            'total': len(distributions)
+        })
+        
+    except Exception as e:
+        logger.error(f"Lead-time lookup error: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/v1/ml/suppliers/lead-times/refresh', methods=['POST'])
+def refresh_lead_times():
+    """Fold newly received purchase order lines into the lead-time cache"""
+    try:
+        if not lead_time_service:
+            return jsonify({
+                'success': False,
+                'error': 'Lead-time service not available'
+            }), 503
+        
+        result = lead_time_service.refresh()
+        
+        return jsonify({
+            'success': True,
+            'result': result,
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        logger.error(f"Lead-time refresh error: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/v1/ml/inventory/reorder-inputs', methods=['POST'])
+def get_reorder_inputs():
+    """
+    Safety stock and reorder point from the fitted lead-time distribution
+    
+    Request body:
+    {
+        "supplier_id": "sup_123",
+        "product_id": "prod_456",  # Optional, falls back to the supplier fit
+        "daily_demand_mean": 12.5,
+        "daily_demand_std": 4.2,
+        "service_level": 0.95
+    }
+    """
+    try:
+        if not lead_time_service:
+            return jsonify({
+                'success': False,
+                'error': 'Lead-time service not available'
+            }), 503
+        
+        data = request.json or {}
+        missing = [
+            field for field in ('supplier_id', 'daily_demand_mean', 'daily_demand_std')
+            if data.get(field) is None
+        ]
+        if missing:
+            return jsonify({
+                'success': False,
+                'error': f'Missing fields: {", ".join(missing)}'
+            }), 400
+        
+        result = lead_time_service.reorder_inputs(
+            data['supplier_id'],
+            data.get('product_id'),
+            float(data['daily_demand_mean']),
+            float(data['daily_demand_std']),
+            service_level=float(data.get('service_level', 0.95))
+        )
+        
+        return jsonify({
+            'success': True,
+            'result': result
+        })
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        logger.error(f"Reorder inputs error: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/v1/ml/scheduler/status', methods=['GET'])
+def get_scheduler_status():
+    """Get per-series error/drift statistics and the last retraining cycle"""
+    try:
+        if not retrain_scheduler:
+            return jsonify({
+                'success': False,
+                'error': 'Retraining scheduler not running'
+            }), 503
+        
+        return jsonify({
+            'success': True,
+            'status': retrain_scheduler.get_status(),
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        logger.error(f"Scheduler status error: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/v1/ml/scheduler/forecasts', methods=['POST'])
+def record_forecast_outcomes():
+    """
+    Record actual values for past forecasts so drifted series get retrained
+    
+    Request body:
+    {
+        "outcomes": [
+            {"series_id": "arima", "predicted": 15200.0, "actual": 14100.0}
+        ]
+    }
+    """
+    try:
+        if not retrain_scheduler:
+            return jsonify({
+                'success': False,
+                'error': 'Retraining scheduler not running'
+            }), 503
+        
+        data = request.json or {}
+        outcomes = data.get('outcomes', [])
+        unknown = sorted({
+            outcome['series_id'] for outcome in outcomes
+            if outcome['series_id'] not in retrain_scheduler.series
+        })
+        if unknown:
+            return jsonify({
+                'success': False,
+                'error': f'Unknown series: {", ".join(unknown)}'
+            }), 400
+        
+        for outcome in outcomes:
+            retrain_scheduler.record_forecast(
+                outcome['series_id'],
+                float(outcome['predicted']),
+                float(outcome['actual'])
+            )
+        
+        return jsonify({
+            'success': True,
+            'recorded': len(outcomes)
+        })
+        
+    except Exception as e:
+        logger.error(f"Forecast outcome error: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/v1/ml/snapshots/refresh', methods=['POST'])
+def refresh_snapshots():
+    """Copy new orders, order items and products into the Parquet snapshots"""
+    try:
+        if not snapshot_service:
+            return jsonify({
+                'success': False,
+                'error': 'Snapshot service not available'
+            }), 503
+        
+        result = snapshot_service.snapshot()
+        
+        return jsonify({
+            'success': True,
+            'result': result
+        })
+        
+    except Exception as e:
+        logger.error(f"Snapshot refresh error: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/v1/ml/memory', methods=['GET'])
+def get_memory_report():
+    """Get peak memory and duration of the latest run of each pipeline stage"""
+    return jsonify({
+        'success': True,
+        'budget_mb': memory_budget_mb(),
+        'rss_mb': round(current_rss_mb(), 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'stages': STAGE_REPORT
+    })
+
+@app.route('/api/v1/ml/products/top', methods=['GET'])
+def get_top_products():
+    """
+    Get top products by units, revenue or growth over a trailing window
+    
+    Query params: metric (units|revenue|growth), window (days, default 30,
+    up to the indexed history), limit (default 20), channel_id (optional)
+    """
+    try:
+        if not product_ranking:
+            return jsonify({
+                'success': False,
+                'error': 'Product ranking not available'
+            }), 503
+        
+        metric = request.args.get('metric', 'units')
+        window = request.args.get('window', 30, type=int)
+        limit = request.args.get('limit', 20, type=int)
+        channel_id = request.args.get('channel_id')
+        
+        product_ranking.refresh_if_stale()
+        products = product_ranking.top(metric, window, limit, channel_id)
+        
+        return jsonify({
+            'success': True,
+            'metric': metric,
+            'window_days': window,
+            'products': products,
+            'as_of': datetime.fromtimestamp(product_ranking.last_refresh).isoformat()
+        })
+        
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        logger.error(f"Top products error: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/v1/ml/products/top/refresh', methods=['POST'])
+def refresh_top_products():
+    """Fold the latest orders into the product ranking index"""
+    try:
+        if not product_ranking:
+            return jsonify({
+                'success': False,
+                'error': 'Product ranking not available'
+            }), 503
+        
+        result = product_ranking.refresh()
+        
+        return jsonify({
+            'success': True,
+            'result': result
+        })
+        
+    except Exception as e:
+        logger.error(f"Product ranking refresh error: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({
@@ -335,7 +761,9 @@ if __name__ == '__main__':
     logger.info(f"Starting ML Prediction Engine on port {port}")
     logger.info(f"Debug mode: {debug_mode}")
     logger.info(f"Database URL configured: {bool(os.getenv('DATABASE_URL'))}")
+    logger.info(f"Data backend: {os.getenv('DATA_BACKEND', 'postgres')}")
     
+    init_services()
     app.run(
         host='0.0.0.0',
         port=port,
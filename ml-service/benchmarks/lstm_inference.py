@@ -0,0 +1,115 @@
+"""
+Compare Keras and TFLite LSTM inference
+
+Each runtime is measured in a fresh process so import time and peak RSS
+reflect what a serving worker would pay. Run from ml-service/ after the
+LSTM has been trained:
+
+    python benchmarks/lstm_inference.py --steps 7 --runs 50 --quantize float16 int8
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+
+def _measure(runtime, model_path, steps, runs, queue):
+    """Load one runtime, time repeated forecasts and report peak RSS"""
+    started = time.perf_counter()
+    if runtime == 'keras':
+        from models.lstm_model import LSTMModel as Model
+    else:
+        from models.lstm_lite_model import LSTMLiteModel as Model
+    import_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    model = Model() if runtime == 'keras' else Model(model_path=model_path)
+    load_seconds = time.perf_counter() - started
+
+    # Warm up once so one-off graph tracing is not counted as latency
+    forecast = [p['prediction'] for p in model.predict(steps=steps)]
+
+    latencies = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        model.predict(steps=steps)
+        latencies.append(time.perf_counter() - started)
+
+    latencies = np.array(latencies) * 1000
+    queue.put({
+        'runtime': runtime,
+        'model_path': model_path,
+        'import_seconds': round(import_seconds, 3),
+        'load_seconds': round(load_seconds, 3),
+        'latency_ms_mean': round(float(latencies.mean()), 3),
+        'latency_ms_p50': round(float(np.percentile(latencies, 50)), 3),
+        'latency_ms_p95': round(float(np.percentile(latencies, 95)), 3),
+        # ru_maxrss is reported in kilobytes on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'forecast': forecast
+    })
+
+
+def _export(quantization, path, queue):
+    """Export a quantized variant from the saved Keras model"""
+    from models.lstm_model import LSTMModel
+    LSTMModel().export_tflite(quantization=quantization, path=path)
+    queue.put(path)
+
+
+def _run_isolated(target, *args):
+    """Run target in a fresh interpreter and return what it puts on the queue"""
+    ctx = mp.get_context('spawn')
+    queue = ctx.Queue()
+    process = ctx.Process(target=target, args=(*args, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError(f"{target.__name__}{args} exited with {process.exitcode}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--steps', type=int, default=7)
+    parser.add_argument('--runs', type=int, default=50)
+    parser.add_argument('--quantize', nargs='*', default=[], choices=['float16', 'int8'])
+    args = parser.parse_args()
+
+    variants = [('keras', None), ('tflite', 'storage/models/lstm_model.tflite')]
+    for quantization in args.quantize:
+        path = f'storage/models/lstm_model_{quantization}.tflite'
+        _run_isolated(_export, quantization, path)
+        variants.append((f'tflite-{quantization}', path))
+
+    results = [
+        _run_isolated(_measure, runtime.split('-')[0], path, args.steps, args.runs)
+        for runtime, path in variants
+    ]
+    for (name, _), result in zip(variants, results):
+        result['runtime'] = name
+
+    baseline = np.array(results[0]['forecast'])
+    for result in results:
+        forecast = np.array(result.pop('forecast'))
+        delta = np.abs(forecast - baseline)
+        result['forecast_max_abs_delta'] = round(float(delta.max()), 4)
+        result['forecast_mean_pct_delta'] = round(
+            float(np.mean(delta / np.maximum(np.abs(baseline), 1e-9)) * 100), 4
+        )
+        if result['model_path']:
+            result['artifact_kb'] = round(os.path.getsize(result['model_path']) / 1024, 1)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
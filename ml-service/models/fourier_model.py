@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+import joblib
+import os
+from fractions import Fraction
+
+class FourierModel:
+    """
+    Linear regression on a trend plus Fourier terms for several seasonal periods
+
+    Fits multi-seasonal series (e.g. 24h and 168h for hourly data) in one
+    least-squares solve instead of a seasonal ARIMA search. The normal
+    equations are kept, so new observations are folded in incrementally.
+
+    A harmonic of a longer period that repeats a shorter period's harmonic
+    (e.g. the 7th weekly harmonic is the daily cycle) is left out, since the
+    duplicate column would make the normal equations singular.
+    """
+
+    def __init__(self, periods=(24, 168), harmonics=(6, 10), name='fourier_hourly'):
+        self.periods = periods
+        self.harmonics = harmonics
+        self.terms = self._terms(periods, harmonics)
+        self.model_path = f'storage/models/{name}_model.pkl'
+        self.coefficients = None
+        self.residual_std = None
+        self.xtx = None
+        self.xty = None
+        self.yty = 0.0
+        self.start = None
+        self.n_obs = 0
+        self.load_model()
+
+    def is_trained(self):
+        """Check if the model has been fitted"""
+        return self.coefficients is not None
+
+    @staticmethod
+    def _terms(periods, harmonics):
+        """(period, harmonic) pairs with distinct frequencies, shortest period first"""
+        terms = []
+        seen = set()
+        for period, k in sorted(zip(periods, harmonics)):
+            for h in range(1, k + 1):
+                frequency = Fraction(h) / Fraction(period)
+                if frequency not in seen:
+                    seen.add(frequency)
+                    terms.append((period, h))
+        return terms
+
+    def _design(self, t):
+        """Intercept, trend and sin/cos terms for absolute time indices t"""
+        t = np.asarray(t, dtype=np.float64)
+        period = np.array([p for p, _ in self.terms], dtype=np.float64)
+        harmonic = np.array([h for _, h in self.terms], dtype=np.float64)
+        angle = 2 * np.pi * np.outer(t, harmonic / period)
+        return np.column_stack([np.ones_like(t), t / max(self.periods), np.sin(angle), np.cos(angle)])
+
+    def train(self, data, start=None):
+        """Fit from scratch on a regularly spaced series"""
+        self.xtx = None
+        self.xty = None
+        self.yty = 0.0
+        self.n_obs = 0
+        self.start = start
+        return self.update(data)
+
+    def update(self, data):
+        """Append observations following the last one seen and refit"""
+        y = np.asarray(data, dtype=np.float64)
+        t = np.arange(self.n_obs, self.n_obs + len(y))
+        X = self._design(t)
+
+        if self.xtx is None:
+            self.xtx = X.T @ X
+            self.xty = X.T @ y
+        else:
+            self.xtx += X.T @ X
+            self.xty += X.T @ y
+        self.yty += float(y @ y)
+        self.n_obs += len(y)
+
+        # Small ridge term keeps the solve stable on short histories
+        ridge = 1e-6 * np.trace(self.xtx) / len(self.xtx)
+        self.coefficients = np.linalg.solve(
+            self.xtx + ridge * np.eye(len(self.xtx)), self.xty
+        )
+
+        b = self.coefficients
+        sse = max(self.yty - 2 * b @ self.xty + b @ self.xtx @ b, 0.0)
+        dof = max(self.n_obs - len(b), 1)
+        self.residual_std = float(np.sqrt(sse / dof))
+
+        self.save_model()
+        return self
+
+    def predict(self, steps=24):
+        """Generate predictions for next n steps"""
+        if self.coefficients is None:
+            raise ValueError("Model not trained yet")
+
+        t = np.arange(self.n_obs, self.n_obs + steps)
+        predictions = np.maximum(self._design(t) @ self.coefficients, 0.0)
+        margin = 1.645 * self.residual_std  # 90% interval
+
+        forecast_df = pd.DataFrame({
+            'prediction': predictions,
+            'lower_bound': np.maximum(predictions - margin, 0.0),
+            'upper_bound': predictions + margin
+        })
+
+        return forecast_df.to_dict('records')
+
+    def save_model(self):
+        """Save fitted state to disk"""
+        os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
+        joblib.dump({
+            'periods': self.periods,
+            'harmonics': self.harmonics,
+            'terms': self.terms,
+            'xtx': self.xtx,
+            'xty': self.xty,
+            'yty': self.yty,
+            'n_obs': self.n_obs,
+            'start': self.start,
+            'coefficients': self.coefficients,
+            'residual_std': self.residual_std
+        }, self.model_path)
+
+    def load_model(self):
+        """Load model from disk if exists"""
+        if os.path.exists(self.model_path):
+            state = joblib.load(self.model_path)
+            # A saved model with different seasonality terms is ignored
+            if state.get('terms') == self.terms:
+                for key, value in state.items():
+                    setattr(self, key, value)
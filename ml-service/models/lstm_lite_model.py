@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import os
+
+try:
+    from tflite_runtime.interpreter import Interpreter
+except ImportError:
+    from ai_edge_litert.interpreter import Interpreter
+
+
+class LSTMLiteModel:
+    """
+    Inference-only LSTM backed by the exported TFLite artifact
+
+    Mirrors LSTMModel.predict without importing TensorFlow, so serving
+    workers only need the small TFLite interpreter.
+    """
+
+    def __init__(self, model_path=None, num_threads=1):
+        self.interpreter = None
+        self.model_path = model_path or 'storage/models/lstm_model.tflite'
+        self.params_path = 'storage/models/lstm_model_lite.npz'
+        self.num_threads = num_threads
+        self.load_model()
+
+    def is_trained(self):
+        """Check if the exported model is loaded"""
+        return self.interpreter is not None
+
+    def train(self, data):
+        """
+        Train the full Keras model, export it and reload the interpreter
+
+        TensorFlow is only imported here, so serving-only workers that
+        never train still do not pay for it.
+        """
+        from models.lstm_model import LSTMModel
+
+        keras_model = LSTMModel()
+        keras_model.lite_params_path = self.params_path
+        # train() exports to the default artifact path
+        keras_model.train(data)
+        if os.path.abspath(self.model_path) != os.path.abspath(keras_model.tflite_path):
+            keras_model.export_tflite(path=self.model_path)
+
+        self.load_model()
+        return self
+
+    def predict(self, steps=7):
+        """Generate predictions for next n steps"""
+        if self.interpreter is None:
+            raise ValueError("Model not exported yet")
+
+        window = self.last_sequence.astype(np.float32).reshape(1, self.sequence_length, 1)
+        scaled = np.empty(steps, dtype=np.float32)
+
+        for i in range(steps):
+            self.interpreter.set_tensor(self.input_index, window)
+            self.interpreter.invoke()
+            next_pred = self.interpreter.get_tensor(self.output_index)[0, 0]
+            scaled[i] = next_pred
+
+            # Slide the window in place for the next step
+            window[0, :-1, 0] = window[0, 1:, 0]
+            window[0, -1, 0] = next_pred
+
+        # Inverse of MinMaxScaler: x = (x_scaled - min) / scale
+        predictions = ((scaled - self.min) / self.scale).astype(np.float64)
+
+        forecast_df = pd.DataFrame({
+            'prediction': predictions,
+            'lower_bound': predictions * 0.95,
+            'upper_bound': predictions * 1.05
+        })
+
+        return forecast_df.to_dict('records')
+
+    def load_model(self):
+        """Load exported model if exists"""
+        if os.path.exists(self.model_path) and os.path.exists(self.params_path):
+            params = np.load(self.params_path)
+            self.scale = params['scale'][0]
+            self.min = params['min'][0]
+            self.last_sequence = params['last_sequence']
+            self.sequence_length = int(params['sequence_length'])
+
+            self.interpreter = Interpreter(
+                model_path=self.model_path,
+                num_threads=self.num_threads
+            )
+            self.interpreter.allocate_tensors()
+            self.input_index = self.interpreter.get_input_details()[0]['index']
+            self.output_index = self.interpreter.get_output_details()[0]['index']
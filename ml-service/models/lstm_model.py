@@ -4,23 +4,33 @@ from tensorflow.keras.models import Sequential, load_model
 from tensorflow.keras.layers import LSTM, Dense, Dropout
 from tensorflow.keras.callbacks import EarlyStopping
 from sklearn.preprocessing import MinMaxScaler
+import joblib
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 class LSTMModel:
     def __init__(self):
         self.model = None
         self.scaler = MinMaxScaler()
         self.model_path = 'storage/models/lstm_model.h5'
+        self.tflite_path = 'storage/models/lstm_model.tflite'
+        self.lite_params_path = 'storage/models/lstm_model_lite.npz'
         self.sequence_length = 30  # Use 30 days of history
+        self.last_sequence = None
         self.load_model()
     
+    def is_trained(self):
+        """Check if a trained model is available"""
+        return self.model is not None and self.last_sequence is not None
+    
     def prepare_sequences(self, data, n_steps):
-        """Prepare sequences for LSTM"""
-        X, y = [], []
-        for i in range(len(data) - n_steps):
-            X.append(data[i:i + n_steps])
-            y.append(data[i + n_steps])
-        return np.array(X), np.array(y)
+        """Prepare sequences for LSTM as strided views over the series (no copies)"""
+        data = np.asarray(data, dtype=np.float32).reshape(-1)
+        X = np.lib.stride_tricks.sliding_window_view(data[:-1], n_steps)
+        y = data[n_steps:]
+        return X, y
     
     def build_model(self, input_shape):
         """Build LSTM architecture"""
@@ -40,16 +50,16 @@ class LSTMModel:
     
     def train(self, data):
         """Train LSTM model"""
-        # Normalize data
+        # Normalize data (MinMaxScaler keeps float32 input as float32)
         data_normalized = self.scaler.fit_transform(
-            np.array(data).reshape(-1, 1)
+            np.asarray(data, dtype=np.float32).reshape(-1, 1)
         )
         
         # Prepare sequences
         X, y = self.prepare_sequences(data_normalized, self.sequence_length)
         
-        # Reshape for LSTM [samples, time steps, features]
-        X = X.reshape((X.shape[0], X.shape[1], 1))
+        # Add the feature axis for LSTM [samples, time steps, features]
+        X = X[..., np.newaxis]
         
         # Build and train model
         self.model = self.build_model((X.shape[1], 1))
@@ -69,10 +79,66 @@ class LSTMModel:
             validation_split=0.2
         )
         
+        # Keep the most recent window to seed forecasts
+        self.last_sequence = data_normalized[-self.sequence_length:].flatten()
+        
         # Save model
         self.save_model()
+        
+        # Export the lightweight inference artifact
+        quantization = os.getenv('LSTM_EXPORT_QUANTIZATION', 'none').lower()
+        try:
+            self.export_tflite(quantization=None if quantization == 'none' else quantization)
+        except Exception as e:
+            logger.error(f"TFLite export failed: {e}")
         return self
     
+    def export_tflite(self, quantization=None, path=None):
+        """
+        Export the trained model as a TFLite flatbuffer for TF-free serving
+        
+        Args:
+            quantization: None, 'float16' (half-precision weights) or
+                'int8' (dynamic-range int8 weights, float activations)
+            path: Output path (defaults to self.tflite_path)
+        """
+        import tensorflow as tf
+        
+        if self.model is None:
+            raise ValueError("Model not trained yet")
+        
+        # A fixed batch of one lets the converter fuse each Keras LSTM into
+        # a single builtin TFLite LSTM op instead of a TensorList loop
+        run = tf.function(lambda x: self.model(x, training=False))
+        concrete = run.get_concrete_function(
+            tf.TensorSpec([1, self.sequence_length, 1], tf.float32)
+        )
+        converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete], self.model)
+        
+        if quantization == 'float16':
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.target_spec.supported_types = [tf.float16]
+        elif quantization == 'int8':
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        elif quantization is not None:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        
+        path = path or self.tflite_path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(converter.convert())
+        
+        # Scaler and seed window as plain arrays so the lite predictor
+        # needs neither TensorFlow nor scikit-learn
+        np.savez(
+            self.lite_params_path,
+            scale=self.scaler.scale_.astype(np.float32),
+            min=self.scaler.min_.astype(np.float32),
+            last_sequence=np.asarray(self.last_sequence, dtype=np.float32),
+            sequence_length=self.sequence_length
+        )
+        return path
+    
     def predict(self, steps=7):
         """Generate predictions for next n steps"""
         if self.model is None:
@@ -110,9 +176,13 @@ class LSTMModel:
         os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
         self.model.save(self.model_path)
         joblib.dump(self.scaler, self.model_path.replace('.h5', '_scaler.pkl'))
+        joblib.dump(self.last_sequence, self.model_path.replace('.h5', '_sequence.pkl'))
     
     def load_model(self):
         """Load model if exists"""
         if os.path.exists(self.model_path):
             self.model = load_model(self.model_path)
             self.scaler = joblib.load(self.model_path.replace('.h5', '_scaler.pkl'))
+            sequence_path = self.model_path.replace('.h5', '_sequence.pkl')
+            if os.path.exists(sequence_path):
+                self.last_sequence = joblib.load(sequence_path)
@@ -1,46 +1,202 @@
 import psycopg2
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import os
+import threading
+
+from utils.memory import compact_frame
 
 class DataService:
     def __init__(self):
         self.db_url = os.getenv('DATABASE_URL')
+        # 'postgres' queries the operational database; 'parquet' runs the
+        # order/product aggregations on DuckDB over local snapshots
+        self.backend = os.getenv('DATA_BACKEND', 'postgres').lower()
+        self.snapshot_dir = os.getenv('SNAPSHOT_DIR', 'storage/snapshots')
+        self.analytics_threads = int(os.getenv('ANALYTICS_THREADS', os.cpu_count() or 1))
+        # Hourly buckets already aggregated; only newer hours are re-queried
+        self._hourly_cache = None
+        self._hourly_cache_hours = None
+        self._hourly_lock = threading.Lock()
     
     def get_connection(self):
         """Get database connection"""
         return psycopg2.connect(self.db_url)
     
-    def get_historical_data(self, days=365):
-        """Fetch historical sales data"""
+    def query_snapshots(self, query, params=None):
+        """
+        Run a DuckDB query over the Parquet snapshots
+        
+        Queries reference {orders}, {order_items} and {products}, which are
+        expanded to hive-partitioned read_parquet scans so filters on
+        `month` prune whole partitions and created_at filters use row-group
+        statistics.
+        """
+        import duckdb
+        
+        scans = {
+            table: f"read_parquet('{os.path.join(self.snapshot_dir, table, pattern)}', "
+                   f"hive_partitioning = {str(partitioned).lower()})"
+            for table, pattern, partitioned in [
+                ('orders', '*/*.parquet', True),
+                ('order_items', '*/*.parquet', True),
+                ('products', '*.parquet', False)
+            ]
+        }
+        
+        conn = duckdb.connect(config={'threads': self.analytics_threads})
+        try:
+            return conn.execute(query.format(**scans), params or []).df()
+        finally:
+            conn.close()
+    
+    def _snapshot_cutoff(self, days):
+        """Timestamp and partition month bounding a trailing window"""
+        cutoff = datetime.now() - timedelta(days=days)
+        return cutoff, cutoff.strftime('%Y-%m')
+    
+    def get_historical_data(self, days=365, granularity='daily'):
+        """Fetch historical sales data (granularity: daily or hourly)"""
+        if granularity == 'hourly':
+            return self.get_hourly_data(hours=days * 24)
+        
+        if self.backend == 'parquet':
+            cutoff, month = self._snapshot_cutoff(days)
+            df = self.query_snapshots("""
+                SELECT 
+                    CAST(created_at AS DATE) as date,
+                    SUM(total_cents) / 100.0 as revenue,
+                    COUNT(*) as orders
+                FROM {orders}
+                WHERE month >= ? AND created_at >= ?
+                GROUP BY CAST(created_at AS DATE)
+                ORDER BY date
+            """, [month, cutoff])
+            compact_frame(df)
+        else:
+            query = """
+                SELECT 
+                    DATE(created_at) as date,
+                    SUM(total_cents) / 100.0 as revenue,
+                    COUNT(*) as orders
+                FROM orders
+                WHERE created_at >= NOW() - INTERVAL '%s days'
+                GROUP BY DATE(created_at)
+                ORDER BY date
+            """
+            
+            with self.get_connection() as conn:
+                df = pd.read_sql_query(query, conn, params=[days],
+                                       dtype={'revenue': 'float32', 'orders': 'int32'})
+        
+        # Fill missing dates with 0
+        return self._fill_periods(df, freq='D')
+    
+    def get_hourly_data(self, hours=24 * 365):
+        """
+        Fetch hourly revenue and orders for the trailing window
+        
+        Completed hours are cached between calls, so after the first load
+        only the latest (possibly still open) hour onwards is aggregated.
+        The cache covers the widest window requested so far; narrower
+        requests are sliced from it.
+        """
+        with self._hourly_lock:
+            now_hour = datetime.now().replace(minute=0, second=0, microsecond=0)
+            cutoff = now_hour - timedelta(hours=hours)
+            cache = self._hourly_cache
+            
+            if cache is None or cache.empty or hours > self._hourly_cache_hours:
+                since = cutoff
+                cache = None
+                self._hourly_cache_hours = hours
+            else:
+                since = cache['date'].iloc[-1].to_pydatetime()
+            
+            fresh = self._query_hourly(since)
+            if cache is not None:
+                fresh = pd.concat([cache[cache['date'] < since], fresh], ignore_index=True)
+            
+            df = self._fill_periods(fresh, freq=pd.offsets.Hour())
+            cache_from = now_hour - timedelta(hours=self._hourly_cache_hours)
+            self._hourly_cache = df[df['date'] >= cache_from].reset_index(drop=True)
+            return self._hourly_cache[self._hourly_cache['date'] >= cutoff].reset_index(drop=True)
+    
+    def _query_hourly(self, since):
+        """Aggregate orders into hourly buckets from `since` onwards"""
+        if self.backend == 'parquet':
+            df = self.query_snapshots("""
+                SELECT 
+                    DATE_TRUNC('hour', created_at) as date,
+                    SUM(total_cents) / 100.0 as revenue,
+                    COUNT(*) as orders
+                FROM {orders}
+                WHERE month >= ? AND created_at >= ?
+                GROUP BY DATE_TRUNC('hour', created_at)
+                ORDER BY date
+            """, [since.strftime('%Y-%m'), since])
+            return compact_frame(df)
+        
         query = """
             SELECT 
-                DATE(created_at) as date,
+                DATE_TRUNC('hour', created_at) as date,
                 SUM(total_cents) / 100.0 as revenue,
                 COUNT(*) as orders
             FROM orders
-            WHERE created_at >= NOW() - INTERVAL '%s days'
-            GROUP BY DATE(created_at)
+            WHERE created_at >= %s
+            GROUP BY DATE_TRUNC('hour', created_at)
             ORDER BY date
         """
         
         with self.get_connection() as conn:
-            df = pd.read_sql_query(query, conn, params=[days])
+            return pd.read_sql_query(query, conn, params=[since],
+                                     dtype={'revenue': 'float32', 'orders': 'int32'})
+    
+    def _fill_periods(self, df, freq):
+        """
+        Expand a sparse revenue/orders series to every period with zeros
         
-        # Fill missing dates with 0
-        date_range = pd.date_range(
-            start=df['date'].min(),
-            end=df['date'].max(),
-            freq='D'
-        )
-        df = df.set_index('date').reindex(date_range, fill_value=0)
-        df.reset_index(inplace=True)
-        df.columns = ['date', 'revenue', 'orders']
+        Values are scattered straight into preallocated float32/int32
+        arrays instead of reindexing, which would copy the frame twice.
+        """
+        if df.empty:
+            return pd.DataFrame({
+                'date': pd.DatetimeIndex([]),
+                'revenue': np.array([], dtype=np.float32),
+                'orders': np.array([], dtype=np.int32)
+            })
         
-        return df
+        dates = pd.DatetimeIndex(pd.to_datetime(df['date']))
+        date_range = pd.date_range(start=dates.min(), end=dates.max(), freq=freq)
+        positions = date_range.get_indexer(dates)
+        
+        revenue = np.zeros(len(date_range), dtype=np.float32)
+        orders = np.zeros(len(date_range), dtype=np.int32)
+        revenue[positions] = df['revenue'].to_numpy(np.float32)
+        orders[positions] = df['orders'].to_numpy(np.int32)
+        
+        return pd.DataFrame({'date': date_range, 'revenue': revenue, 'orders': orders}, copy=False)
     
     def get_product_data(self):
         """Fetch product sales data"""
+        if self.backend == 'parquet':
+            cutoff, month = self._snapshot_cutoff(90)
+            return self.query_snapshots("""
+                SELECT 
+                    p.sku,
+                    p.title,
+                    COUNT(oi.id) as sales_count,
+                    SUM(oi.total_cents) / 100.0 as total_revenue
+                FROM {products} p
+                JOIN {order_items} oi ON p.id = oi.product_id
+                JOIN {orders} o ON oi.order_id = o.id
+                WHERE o.month >= ? AND oi.month >= ? AND o.created_at >= ?
+                GROUP BY p.sku, p.title
+                ORDER BY sales_count DESC
+                LIMIT 20
+            """, [month, month, cutoff])
+        
         query = """
             SELECT 
                 p.sku,
@@ -60,3 +216,184 @@ class DataService:
             df = pd.read_sql_query(query, conn)
         
         return df
+    
+    def get_inventory_positions(self):
+        """
+        Fetch on-hand and incoming stock for every active product
+        
+        supplier_id is the supplier of the product's most recent purchase
+        order (None if it was never ordered).
+        """
+        query = """
+            SELECT 
+                p.id as product_id,
+                p.sku,
+                last_po.supplier_id,
+                COALESCE(i.available_quantity, i.quantity, 0) as on_hand,
+                COALESCE(i.incoming_quantity, 0) as incoming,
+                COALESCE(i.lead_time_days, 7) as lead_time_days
+            FROM products p
+            LEFT JOIN inventory i ON i.product_id = p.id
+            LEFT JOIN LATERAL (
+                SELECT po.supplier_id
+                FROM purchase_order_items poi
+                JOIN purchase_orders po ON poi.po_id = po.id
+                WHERE poi.product_id = p.id
+                ORDER BY po.order_date DESC NULLS LAST
+                LIMIT 1
+            ) last_po ON TRUE
+            WHERE p.active = TRUE
+            ORDER BY p.id
+        """
+        
+        with self.get_connection() as conn:
+            df = pd.read_sql_query(query, conn, dtype={
+                'on_hand': 'int32', 'incoming': 'int32', 'lead_time_days': 'int32'
+            })
+        
+        return df
+    
+    def get_open_purchase_orders(self):
+        """Fetch outstanding purchase order lines with their expected arrival"""
+        query = """
+            SELECT 
+                poi.product_id,
+                COALESCE(poi.expected_date, po.expected_date) as expected_date,
+                poi.quantity_ordered - poi.quantity_received as quantity_open
+            FROM purchase_order_items poi
+            JOIN purchase_orders po ON poi.po_id = po.id
+            WHERE po.status IN ('SENT', 'CONFIRMED', 'SHIPPED', 'PARTIAL_RECEIVED')
+              AND poi.quantity_ordered > poi.quantity_received
+        """
+        
+        with self.get_connection() as conn:
+            df = pd.read_sql_query(query, conn, dtype={'quantity_open': 'int32'})
+        
+        return compact_frame(df, id_columns=['product_id'])
+    
+    def get_product_daily_demand(self, days=90):
+        """Fetch units sold per product per day"""
+        if self.backend == 'parquet':
+            cutoff, month = self._snapshot_cutoff(days)
+            df = self.query_snapshots("""
+                SELECT 
+                    oi.product_id,
+                    CAST(o.created_at AS DATE) as date,
+                    SUM(oi.quantity) as units
+                FROM {order_items} oi
+                JOIN {orders} o ON oi.order_id = o.id
+                WHERE o.month >= ? AND oi.month >= ? AND o.created_at >= ?
+                  AND oi.product_id IS NOT NULL
+                GROUP BY oi.product_id, CAST(o.created_at AS DATE)
+            """, [month, month, cutoff])
+            return compact_frame(df, id_columns=['product_id'])
+        
+        query = """
+            SELECT 
+                oi.product_id,
+                DATE(o.created_at) as date,
+                SUM(oi.quantity) as units
+            FROM order_items oi
+            JOIN orders o ON oi.order_id = o.id
+            WHERE o.created_at >= NOW() - INTERVAL '%s days'
+              AND oi.product_id IS NOT NULL
+            GROUP BY oi.product_id, DATE(o.created_at)
+        """
+        
+        with self.get_connection() as conn:
+            df = pd.read_sql_query(query, conn, params=[days], dtype={'units': 'int32'})
+        
+        return compact_frame(df, id_columns=['product_id'])
+    
+    def get_product_daily_sales(self, since):
+        """Fetch units and revenue (cents) per product per day from `since` onwards"""
+        if self.backend == 'parquet':
+            df = self.query_snapshots("""
+                SELECT 
+                    oi.product_id,
+                    p.channel_id,
+                    p.sku,
+                    p.title,
+                    CAST(o.created_at AS DATE) as date,
+                    SUM(oi.quantity) as units,
+                    SUM(oi.total_cents) as revenue_cents
+                FROM {order_items} oi
+                JOIN {orders} o ON oi.order_id = o.id
+                JOIN {products} p ON oi.product_id = p.id
+                WHERE o.month >= ? AND oi.month >= ? AND o.created_at >= ?
+                GROUP BY oi.product_id, p.channel_id, p.sku, p.title, CAST(o.created_at AS DATE)
+            """, [since.strftime('%Y-%m'), since.strftime('%Y-%m'), since])
+            return compact_frame(df, id_columns=['product_id', 'channel_id'])
+        
+        query = """
+            SELECT 
+                oi.product_id,
+                p.channel_id,
+                p.sku,
+                p.title,
+                DATE(o.created_at) as date,
+                SUM(oi.quantity) as units,
+                SUM(oi.total_cents) as revenue_cents
+            FROM order_items oi
+            JOIN orders o ON oi.order_id = o.id
+            JOIN products p ON oi.product_id = p.id
+            WHERE o.created_at >= %s
+            GROUP BY oi.product_id, p.channel_id, p.sku, p.title, DATE(o.created_at)
+        """
+        
+        with self.get_connection() as conn:
+            df = pd.read_sql_query(query, conn, params=[since], dtype={
+                'units': 'int64', 'revenue_cents': 'int64'
+            })
+        
+        return compact_frame(df, id_columns=['product_id', 'channel_id'])
+    
+    def stream_purchase_order_lines(self, since=None, chunk_size=50000):
+        """
+        Stream received purchase order lines in chunks
+        
+        Uses a server-side cursor so the full PO history is never held in
+        memory at once. Only lines updated at or after `since` are returned,
+        so receipts and rejections recorded later re-appear; callers key
+        lines by line_id and replace what they saw before.
+        """
+        columns = [
+            'line_id', 'supplier_id', 'product_id', 'order_date',
+            'expected_date', 'received_date', 'quantity_ordered',
+            'quantity_received', 'quantity_rejected', 'updated_at'
+        ]
+        query = """
+            SELECT 
+                poi.id as line_id,
+                po.supplier_id,
+                poi.product_id,
+                po.order_date,
+                COALESCE(poi.expected_date, po.expected_date) as expected_date,
+                COALESCE(poi.received_date, po.received_date) as received_date,
+                poi.quantity_ordered,
+                poi.quantity_received,
+                poi.quantity_rejected,
+                GREATEST(poi.updated_at, po.updated_at) as updated_at
+            FROM purchase_order_items poi
+            JOIN purchase_orders po ON poi.po_id = po.id
+            WHERE COALESCE(poi.received_date, po.received_date) IS NOT NULL
+        """
+        params = []
+        if since is not None:
+            query += " AND GREATEST(poi.updated_at, po.updated_at) >= %s"
+            params.append(since)
+        query += " ORDER BY updated_at"
+        
+        yield from self.stream_query(query, params, columns, chunk_size)
+    
+    def stream_query(self, query, params, columns, chunk_size=50000):
+        """Yield query results as DataFrame chunks via a server-side cursor"""
+        with self.get_connection() as conn:
+            with conn.cursor(name='ml_stream') as cursor:
+                cursor.itersize = chunk_size
+                cursor.execute(query, params)
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield pd.DataFrame(rows, columns=columns)
@@ -0,0 +1,242 @@
+# ml-service/services/feature_store.py
+import json
+import logging
+import os
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from services.data_service import DataService
+
+logger = logging.getLogger(__name__)
+
+LAGS = [1, 7, 14, 28]
+ROLLING_WINDOWS = [7, 28]
+
+FEATURE_COLUMNS = (
+    ['value']
+    + [f'lag_{lag}' for lag in LAGS]
+    + [f'roll_mean_{w}' for w in ROLLING_WINDOWS]
+    + [f'roll_std_{w}' for w in ROLLING_WINDOWS]
+    + ['dow_sin', 'dow_cos', 'doy_sin', 'doy_cos', 'is_weekend']
+)
+
+# History needed to compute every feature of a new row
+_LOOKBACK = max(LAGS + ROLLING_WINDOWS)
+
+# Bumped when feature definitions change; older series are rebuilt
+FEATURE_VERSION = 2
+
+
+class FeatureStore:
+    """
+    Daily lag, rolling-window and calendar features materialized on disk
+
+    Each series lives in its own directory with one float32 file per
+    column. Rows are consecutive days from the series' start date, so new
+    days are appended (or the last partial day rewritten) without touching
+    the rest of the file. Reads return read-only memory maps, never copies.
+
+    Every derived feature at row t uses only days before t (rolling windows
+    end at t-1, like the lags), so they can be used to predict `value[t]`.
+    """
+
+    def __init__(self, root: str = 'storage/features'):
+        self.root = root
+        self.data_service = DataService()
+
+    def _series_dir(self, series_id: str) -> str:
+        return os.path.join(self.root, series_id)
+
+    def _column_path(self, series_id: str, column: str) -> str:
+        return os.path.join(self._series_dir(series_id), f'{column}.f32')
+
+    def load_meta(self, series_id: str) -> Optional[Dict]:
+        """Start date, row count and capacity of a series, if materialized"""
+        path = os.path.join(self._series_dir(series_id), 'meta.json')
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _save_meta(self, series_id: str, meta: Dict):
+        path = os.path.join(self._series_dir(series_id), 'meta.json')
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, path)
+
+    def _ensure_capacity(self, series_id: str, meta: Dict, rows: int):
+        """Grow every column file geometrically so appends stay amortized O(1)"""
+        if rows <= meta['capacity']:
+            return
+        capacity = max(rows, meta['capacity'] * 2, 64)
+        for column in FEATURE_COLUMNS:
+            with open(self._column_path(series_id, column), 'ab') as f:
+                f.truncate(capacity * 4)
+        meta['capacity'] = capacity
+
+    def update(self, series_id: str, start: date, values: np.ndarray) -> int:
+        """
+        Write daily values starting at `start` and refresh derived features
+
+        Days already stored from `start` onwards are overwritten, so the
+        current (still accumulating) day can be re-sent on every sync.
+
+        Returns:
+            Number of rows written
+        """
+        values = np.asarray(values, dtype=np.float32)
+        os.makedirs(self._series_dir(series_id), exist_ok=True)
+
+        meta = self.load_meta(series_id)
+        if meta is not None and meta.get('version') != FEATURE_VERSION:
+            self._rebuild(series_id, meta)
+            meta = self.load_meta(series_id)
+        if meta is None:
+            meta = {'start_date': start.isoformat(), 'rows': 0, 'capacity': 0,
+                    'version': FEATURE_VERSION}
+            for column in FEATURE_COLUMNS:
+                open(self._column_path(series_id, column), 'wb').close()
+
+        origin = date.fromisoformat(meta['start_date'])
+        offset = (start - origin).days
+        if offset < 0:
+            # Older history than stored is not backfilled
+            values = values[-offset:]
+            offset = 0
+        if offset > meta['rows']:
+            # Missing days between the stored tail and new data had no orders
+            values = np.concatenate([np.zeros(offset - meta['rows'], np.float32), values])
+            offset = meta['rows']
+        if len(values) == 0:
+            return 0
+
+        end = offset + len(values)
+        self._ensure_capacity(series_id, meta, end)
+
+        columns = {
+            column: np.memmap(self._column_path(series_id, column), dtype=np.float32,
+                              mode='r+', shape=(meta['capacity'],))
+            for column in FEATURE_COLUMNS
+        }
+
+        # Only the lookback tail is read back to compute the new rows' features
+        head = max(0, offset - _LOOKBACK)
+        series = np.concatenate([columns['value'][head:offset], values])
+        new = slice(offset - head, len(series))
+
+        columns['value'][offset:end] = values
+        for lag in LAGS:
+            lagged = np.full(len(series), np.nan, dtype=np.float32)
+            lagged[lag:] = series[:-lag]
+            columns[f'lag_{lag}'][offset:end] = lagged[new]
+
+        # Rolling stats over the w days before each row (excluding the row
+        # itself) from cumulative sums over the tail plus new rows
+        csum = np.concatenate([[0.0], np.cumsum(series, dtype=np.float64)])
+        csq = np.concatenate([[0.0], np.cumsum(series.astype(np.float64) ** 2)])
+        # Absolute row index of each position within `series`
+        positions = np.arange(head, head + len(series))
+        for w in ROLLING_WINDOWS:
+            hi = np.arange(len(series))
+            lo = np.maximum(hi - w, 0)
+            count = np.maximum(hi - lo, 1)
+            mean = (csum[hi] - csum[lo]) / count
+            var = np.maximum((csq[hi] - csq[lo]) / count - mean * mean, 0.0)
+            # Windows that reach before the start of the series are incomplete
+            incomplete = positions < w
+            mean[incomplete] = np.nan
+            var[incomplete] = np.nan
+            columns[f'roll_mean_{w}'][offset:end] = mean[new]
+            columns[f'roll_std_{w}'][offset:end] = np.sqrt(var)[new]
+
+        days = pd.date_range(origin + timedelta(days=offset), periods=len(values), freq='D')
+        dow = 2 * np.pi * days.dayofweek.to_numpy() / 7
+        doy = 2 * np.pi * days.dayofyear.to_numpy() / 365.25
+        columns['dow_sin'][offset:end] = np.sin(dow)
+        columns['dow_cos'][offset:end] = np.cos(dow)
+        columns['doy_sin'][offset:end] = np.sin(doy)
+        columns['doy_cos'][offset:end] = np.cos(doy)
+        columns['is_weekend'][offset:end] = days.dayofweek.to_numpy() >= 5
+
+        for column in columns.values():
+            column.flush()
+
+        meta['rows'] = end
+        self._save_meta(series_id, meta)
+        return len(values)
+
+    def _rebuild(self, series_id: str, meta: Dict):
+        """Recompute every feature of a series stored under older definitions"""
+        os.remove(os.path.join(self._series_dir(series_id), 'meta.json'))
+        if meta['rows'] == 0:
+            return
+        values = np.array(np.memmap(self._column_path(series_id, 'value'), dtype=np.float32,
+                                    mode='r', shape=(meta['rows'],)))
+        logger.info(f"Rebuilding features for {series_id} (version {meta.get('version', 1)})")
+        self.update(series_id, date.fromisoformat(meta['start_date']), values)
+
+    def sync(self, series_id: str = 'revenue', days: int = 365) -> int:
+        """
+        Pull new days of a DataService daily series into the store
+
+        Only days from the last stored one onward are fetched once the
+        series exists; `days` bounds the initial load.
+        """
+        today = date.today()
+        meta = self.load_meta(series_id)
+        if meta is not None and meta['rows'] > 0:
+            first = date.fromisoformat(meta['start_date']) + timedelta(days=meta['rows'] - 1)
+        else:
+            first = today - timedelta(days=days - 1)
+
+        # The trailing window starts at the current time of day, so its
+        # oldest bucket is a partial day; fetch one day more and drop it
+        df = self.data_service.get_historical_data(days=(today - first).days + 1)
+        df = df[pd.to_datetime(df['date']) >= pd.Timestamp(first)]
+        if df.empty:
+            return 0
+
+        start = pd.Timestamp(df['date'].iloc[0]).date()
+        written = self.update(series_id, start, df[series_id].to_numpy())
+        logger.info(f"Feature store synced {written} rows for {series_id}")
+        return written
+
+    def get(self, series_id: str, columns: Optional[List[str]] = None,
+            start: Optional[date] = None, end: Optional[date] = None) -> Dict[str, np.ndarray]:
+        """
+        Zero-copy read-only slices of feature columns
+
+        Args:
+            series_id: Series to read
+            columns: Feature columns (default all)
+            start: First day to include
+            end: Last day to include
+
+        Returns:
+            Column name to float32 memory-mapped array
+        """
+        meta = self.load_meta(series_id)
+        if meta is None or meta['rows'] == 0:
+            raise KeyError(f"No features materialized for {series_id}")
+
+        origin = date.fromisoformat(meta['start_date'])
+        lo = max((start - origin).days, 0) if start else 0
+        hi = min((end - origin).days + 1, meta['rows']) if end else meta['rows']
+
+        result = {}
+        for column in columns or FEATURE_COLUMNS:
+            if column not in FEATURE_COLUMNS:
+                raise ValueError(f"Unknown feature column: {column}")
+            mapped = np.memmap(self._column_path(series_id, column), dtype=np.float32,
+                               mode='r', shape=(meta['rows'],))
+            result[column] = mapped[lo:hi]
+        return result
+
+    def windows(self, series_id: str, length: int, column: str = 'value') -> np.ndarray:
+        """Sliding windows of `length` days as a strided view over the mapped column"""
+        values = self.get(series_id, [column])[column]
+        return np.lib.stride_tricks.sliding_window_view(values, length)
@@ -0,0 +1,299 @@
+# ml-service/services/lead_time_service.py
+import logging
+import os
+import threading
+from datetime import datetime
+from statistics import NormalDist
+from typing import Dict, Any, Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from services.data_service import DataService
+from utils.memory import chunk_size as default_chunk_size, track_stage
+
+logger = logging.getLogger(__name__)
+
+# Running sums kept per group; all of them merge by plain addition so new
+# receipts can be folded in (and re-read lines backed out) without
+# re-reading history.
+MOMENTS = [
+    'n', 'lead_sum', 'lead_sq', 'log_sum', 'log_sq',
+    'late_n', 'late_sum', 'on_time',
+    'qty_ordered', 'qty_accepted'
+]
+
+# Per-line values behind each line's contribution to the running sums
+LINE_COLUMNS = ['supplier_id', 'product_id', 'lead', 'late', 'qty_ordered', 'qty_accepted']
+
+LEVELS = {
+    'supplier': ['supplier_id'],
+    'supplier_product': ['supplier_id', 'product_id']
+}
+
+
+class LeadTimeService:
+    """Supplier lead-time and fill-rate distributions from purchase order history"""
+
+    # Lead times are histogrammed in whole days up to this cap
+    MAX_LEAD_DAYS = 365
+    # Minimum receipts before a group's fit is trusted over its parent
+    MIN_SAMPLES = 5
+
+    def __init__(self):
+        self.data_service = DataService()
+        self.cache_path = 'storage/lead_times/lead_time_stats.pkl'
+        self.default_lead_time_days = 7
+        self.watermark = None
+        self.tables = {level: self._empty_table(len(cols)) for level, cols in LEVELS.items()}
+        self.lines = pd.DataFrame(columns=LINE_COLUMNS, index=pd.Index([], name='line_id'))
+        # Scheduled and on-demand refreshes must not interleave
+        self._refresh_lock = threading.Lock()
+        self.load_cache()
+
+    def refresh(self, chunk_size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Fold purchase order lines updated since the last run into the cache
+
+        Lines are re-read from the last update time seen (inclusive), so
+        partial receipts and late rejections replace a line's earlier
+        contribution rather than being missed or counted twice.
+
+        Returns:
+            Number of lines processed and groups known per level
+        """
+        processed = 0
+        with self._refresh_lock, track_stage('lead_time_refresh'):
+            for chunk in self.data_service.stream_purchase_order_lines(
+                since=self.watermark, chunk_size=chunk_size or default_chunk_size()
+            ):
+                values = self._line_values(chunk)
+                seen = self.lines.index.intersection(values.index)
+                for level in LEVELS:
+                    if len(seen):
+                        self._accumulate(level, self.lines.loc[seen], sign=-1)
+                    self._accumulate(level, values)
+                self.lines = pd.concat([self.lines.drop(seen), values])
+
+                latest = pd.to_datetime(chunk['updated_at']).max().to_pydatetime(warn=False)
+                if self.watermark is None or latest > self.watermark:
+                    self.watermark = latest
+                processed += len(chunk)
+
+            if processed:
+                self.save_cache()
+
+        logger.info(f"Lead-time refresh processed {processed} updated PO lines")
+        return {
+            'lines_processed': processed,
+            'suppliers': len(self.tables['supplier']['keys']),
+            'supplier_products': len(self.tables['supplier_product']['keys']),
+            'watermark': self.watermark.isoformat() if self.watermark else None
+        }
+
+    def _line_values(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """Lead time, lateness (days) and quantities per PO line"""
+        ordered = pd.to_datetime(chunk['order_date'])
+        expected = pd.to_datetime(chunk['expected_date'])
+        received = pd.to_datetime(chunk['received_date'])
+
+        return pd.DataFrame({
+            'supplier_id': chunk['supplier_id'].to_numpy(),
+            'product_id': chunk['product_id'].to_numpy(),
+            'lead': ((received - ordered).dt.total_seconds() / 86400).to_numpy(np.float64),
+            'late': ((received - expected).dt.total_seconds() / 86400).to_numpy(np.float64),
+            'qty_ordered': chunk['quantity_ordered'].to_numpy(np.float64),
+            'qty_accepted': (
+                chunk['quantity_received'].to_numpy(np.float64)
+                - chunk['quantity_rejected'].to_numpy(np.float64)
+            )
+        }, index=pd.Index(chunk['line_id'].to_numpy(), name='line_id'))
+
+    def _accumulate(self, level: str, lines: pd.DataFrame, sign: int = 1):
+        """Add (or with sign=-1 remove) lines' grouped sums and histograms"""
+        table = self.tables[level]
+        chunk_keys = pd.MultiIndex.from_frame(lines[LEVELS[level]])
+        keys = table['keys'].append(chunk_keys.unique()).unique()
+        codes = keys.get_indexer(chunk_keys)
+        n_groups = len(keys)
+
+        lead = lines['lead'].to_numpy(np.float64)
+        has_lead = ~np.isnan(lead) & (lead >= 0)
+        lead = np.where(has_lead, lead, 0.0)
+        log_lead = np.where(has_lead, np.log(np.maximum(lead, 0.5)), 0.0)
+
+        late = lines['late'].to_numpy(np.float64)
+        has_late = ~np.isnan(late)
+        late = np.where(has_late, late, 0.0)
+
+        columns = [
+            has_lead, lead, lead * lead, log_lead, log_lead * log_lead,
+            has_late, late, has_late & (late <= 0),
+            lines['qty_ordered'].to_numpy(np.float64),
+            lines['qty_accepted'].to_numpy(np.float64)
+        ]
+
+        moments = np.zeros((n_groups, len(MOMENTS)))
+        moments[:len(table['moments'])] = table['moments']
+        for j, values in enumerate(columns):
+            moments[:, j] += sign * np.bincount(codes, weights=values.astype(np.float64), minlength=n_groups)
+
+        n_bins = self.MAX_LEAD_DAYS + 1
+        hist = np.zeros((n_groups, n_bins), dtype=np.int64)
+        hist[:len(table['hist'])] = table['hist']
+        bins = np.minimum(np.rint(lead), self.MAX_LEAD_DAYS).astype(np.int64)
+        flat = codes[has_lead] * n_bins + bins[has_lead]
+        hist += sign * np.bincount(flat, minlength=n_groups * n_bins).reshape(n_groups, n_bins)
+
+        self.tables[level] = {'keys': keys, 'moments': moments, 'hist': hist}
+
+    def get_distribution(self, supplier_id: str, product_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Lead-time and fill-rate distribution for a supplier or supplier-product
+
+        Falls back from supplier-product to supplier to the static default
+        when a group has fewer than MIN_SAMPLES receipts.
+        """
+        candidates = []
+        if product_id is not None:
+            candidates.append(('supplier_product', (supplier_id, product_id)))
+        candidates.append(('supplier', (supplier_id,)))
+
+        for level, key in candidates:
+            summary = self._summarize(level, key)
+            if summary and summary['samples'] >= self.MIN_SAMPLES:
+                return summary
+
+        return {
+            'level': 'default',
+            'supplier_id': supplier_id,
+            'product_id': product_id,
+            'samples': 0,
+            'mean_days': float(self.default_lead_time_days),
+            'std_days': 0.0,
+            'p50_days': self.default_lead_time_days,
+            'p90_days': self.default_lead_time_days,
+            'p95_days': self.default_lead_time_days,
+            'fill_rate': 1.0,
+            'on_time_rate': None
+        }
+
+    def get_all_distributions(self, level: str = 'supplier'):
+        """Summaries for every group at a level"""
+        return [
+            self._summarize(level, key)
+            for key in self.tables[level]['keys']
+        ]
+
+    def reorder_inputs(self, supplier_id: str, product_id: Optional[str],
+                       daily_demand_mean: float, daily_demand_std: float,
+                       service_level: float = 0.95) -> Dict[str, Any]:
+        """
+        Safety stock and reorder point using the fitted lead-time distribution
+
+        Uses the standard combined-variance formula
+        SS = z * sqrt(L * sd_d^2 + d^2 * sd_L^2) in place of a fixed lead time.
+        """
+        dist = self.get_distribution(supplier_id, product_id)
+        z = NormalDist().inv_cdf(service_level)
+        lead_mean = dist['mean_days']
+        lead_std = dist['std_days']
+
+        safety_stock = z * np.sqrt(
+            lead_mean * daily_demand_std ** 2 + daily_demand_mean ** 2 * lead_std ** 2
+        )
+        # Inflate order quantities to offset short-shipped or rejected units
+        fill_rate = max(dist['fill_rate'], 0.01)
+
+        return {
+            'lead_time': dist,
+            'service_level': service_level,
+            'safety_stock': round(float(safety_stock), 2),
+            'reorder_point': round(float(daily_demand_mean * lead_mean + safety_stock), 2),
+            'order_quantity_multiplier': round(1.0 / fill_rate, 4)
+        }
+
+    def _summarize(self, level: str, key) -> Optional[Dict[str, Any]]:
+        """Turn one group's running sums into distribution parameters"""
+        table = self.tables[level]
+        try:
+            row = table['keys'].get_loc(key)
+        except KeyError:
+            return None
+
+        m = dict(zip(MOMENTS, table['moments'][row].tolist()))
+        n = m['n']
+        cols = LEVELS[level]
+        summary = {'level': level, **dict(zip(cols, key)), 'samples': int(n)}
+        if 'product_id' not in summary:
+            summary['product_id'] = None
+
+        if n > 0:
+            mean = m['lead_sum'] / n
+            var = max(m['lead_sq'] / n - mean * mean, 0.0)
+            log_mean = m['log_sum'] / n
+            log_var = max(m['log_sq'] / n - log_mean * log_mean, 0.0)
+
+            cdf = np.cumsum(table['hist'][row]) / n
+            p50, p90, p95 = (int(np.searchsorted(cdf, q)) for q in (0.5, 0.9, 0.95))
+
+            summary.update({
+                'mean_days': round(mean, 2),
+                'std_days': round(float(np.sqrt(var)), 2),
+                'p50_days': p50,
+                'p90_days': p90,
+                'p95_days': p95,
+                'lognormal': {'mu': round(log_mean, 4), 'sigma': round(float(np.sqrt(log_var)), 4)},
+                'gamma': {
+                    'shape': round(mean * mean / var, 4) if var > 0 else None,
+                    'scale': round(var / mean, 4) if mean > 0 else None
+                }
+            })
+        else:
+            summary.update({
+                'mean_days': float(self.default_lead_time_days),
+                'std_days': 0.0
+            })
+
+        summary['fill_rate'] = round(
+            m['qty_accepted'] / m['qty_ordered'], 4
+        ) if m['qty_ordered'] > 0 else 1.0
+        summary['on_time_rate'] = round(
+            m['on_time'] / m['late_n'], 4
+        ) if m['late_n'] > 0 else None
+        summary['mean_days_late'] = round(
+            m['late_sum'] / m['late_n'], 2
+        ) if m['late_n'] > 0 else None
+
+        return summary
+
+    def _empty_table(self, n_levels: int):
+        """Empty keys, running sums and histogram for one grouping level"""
+        return {
+            'keys': pd.MultiIndex.from_arrays([[] for _ in range(n_levels)]),
+            'moments': np.zeros((0, len(MOMENTS))),
+            'hist': np.zeros((0, self.MAX_LEAD_DAYS + 1), dtype=np.int64)
+        }
+
+    def save_cache(self):
+        """Save running statistics, per-line values and watermark to disk"""
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        joblib.dump({
+            'watermark': self.watermark,
+            'tables': self.tables,
+            'lines': self.lines,
+            'saved_at': datetime.now().isoformat()
+        }, self.cache_path)
+
+    def load_cache(self):
+        """Load running statistics from disk if they exist"""
+        if os.path.exists(self.cache_path):
+            cached = joblib.load(self.cache_path)
+            # Caches without per-line values cannot replace re-read lines
+            # and are rebuilt from scratch on the next refresh
+            if 'lines' not in cached:
+                return
+            self.watermark = cached['watermark']
+            self.tables = cached['tables']
+            self.lines = cached['lines']
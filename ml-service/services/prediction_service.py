@@ -6,12 +6,15 @@ import pandas as pd
 from typing import List, Dict, Any
 import joblib
 import os
+import threading
 
 # Import models (we'll create these next)
 from models.arima_model import ARIMAModel
-from models.lstm_model import LSTMModel
 from models.ensemble_model import EnsembleModel
+from models.fourier_model import FourierModel
 from services.data_service import DataService
+from services.feature_store import FeatureStore
+from utils.memory import track_stage
 
 logger = logging.getLogger(__name__)
 
@@ -20,7 +23,10 @@ class PredictionService:
     
     def __init__(self):
         self.data_service = DataService()
+        self.feature_store = FeatureStore()
         self.models = {}
+        # Hourly forecasts advance one shared Fourier model in place
+        self._hourly_lock = threading.Lock()
         self.initialize_models()
     
     def initialize_models(self):
@@ -35,12 +41,22 @@ class PredictionService:
         
         try:
             # Initialize LSTM model
-            self.models['lstm'] = LSTMModel()
+            self.models['lstm'] = self._load_lstm()
             logger.info("LSTM model initialized")
         except Exception as e:
             logger.error(f"Failed to initialize LSTM model: {e}")
             self.models['lstm'] = None
         
+        try:
+            # Initialize hourly model (24h and 168h seasonality)
+            self.models['fourier_hourly'] = FourierModel(
+                periods=(24, 168), harmonics=(6, 10), name='fourier_hourly'
+            )
+            logger.info("Hourly Fourier model initialized")
+        except Exception as e:
+            logger.error(f"Failed to initialize hourly Fourier model: {e}")
+            self.models['fourier_hourly'] = None
+        
         try:
             # Initialize Ensemble model
             self.models['ensemble'] = EnsembleModel(
@@ -52,6 +68,29 @@ class PredictionService:
             logger.error(f"Failed to initialize Ensemble model: {e}")
             self.models['ensemble'] = None
     
+    def _load_lstm(self):
+        """
+        Load the LSTM for serving
+        
+        Prefers the exported TFLite artifact so workers never import
+        TensorFlow; LSTM_RUNTIME=keras forces the full Keras model.
+        """
+        runtime = os.getenv('LSTM_RUNTIME', 'auto').lower()
+        if runtime in ('auto', 'tflite'):
+            try:
+                from models.lstm_lite_model import LSTMLiteModel
+                model = LSTMLiteModel()
+                if model.is_trained():
+                    logger.info("Serving LSTM from TFLite artifact")
+                    return model
+            except ImportError as e:
+                if runtime == 'tflite':
+                    raise
+                logger.warning(f"TFLite runtime not available: {e}")
+        
+        from models.lstm_model import LSTMModel
+        return LSTMModel()
+    
     def predict(self, days_ahead: int = 7, model_type: str = 'ensemble') -> List[Dict[str, Any]]:
         """
         Generate predictions for the specified number of days
@@ -78,12 +117,15 @@ class PredictionService:
             # Check if model is trained
             if not model.is_trained():
                 logger.warning(f"Model {model_type} not trained, training now...")
-                # Get historical data and train
-                historical_data = self.data_service.get_historical_data(days=365)
-                if not historical_data.empty:
-                    model.train(historical_data['revenue'].values)
-                else:
-                    return self._simple_prediction(days_ahead)
+                # Bring the materialized revenue series up to date and train on it
+                with track_stage('load_revenue'):
+                    self.feature_store.sync('revenue')
+                    try:
+                        revenue = self.feature_store.get('revenue', ['value'])['value']
+                    except KeyError:
+                        return self._simple_prediction(days_ahead)
+                with track_stage(f'train_{model_type}'):
+                    model.train(revenue)
             
             # Generate predictions
             predictions = model.predict(steps=days_ahead)
@@ -130,6 +172,67 @@ class PredictionService:
             # Return simple prediction as fallback
             return self._simple_prediction(days_ahead)
     
+    def predict_hourly(self, hours_ahead: int = 24, history_days: int = 365) -> List[Dict[str, Any]]:
+        """
+        Generate hourly predictions for flash-sale and staffing planning
+        
+        The Fourier model is fitted once on the trailing history and then
+        only fed the hours completed since its last update.
+        
+        Args:
+            hours_ahead: Number of hours to predict
+            history_days: Days of hourly history used for the initial fit
+        
+        Returns:
+            List of predictions with timestamps and values
+        """
+        model = self.models.get('fourier_hourly')
+        if model is None:
+            raise ValueError("Hourly model not available")
+        
+        # Concurrent requests would otherwise feed the same hours into the
+        # model twice and push its phase ahead of real time
+        with self._hourly_lock:
+            with track_stage('load_hourly'):
+                data = self.data_service.get_historical_data(days=history_days, granularity='hourly')
+            if data.empty:
+                raise ValueError("No hourly sales history available")
+            
+            # Lay the history on a complete hourly grid up to the last finished
+            # hour; the current hour is still accumulating orders
+            current_hour = pd.Timestamp(datetime.now().replace(minute=0, second=0, microsecond=0))
+            hours = pd.date_range(data['date'].iloc[0], current_hour - pd.Timedelta(hours=1),
+                                  freq=pd.offsets.Hour())
+            data = data[data['date'] < current_hour]
+            revenue = np.zeros(len(hours), dtype=np.float32)
+            revenue[hours.get_indexer(data['date'])] = data['revenue'].to_numpy(np.float32)
+            
+            with track_stage('train_fourier_hourly'):
+                next_hour = model.start + pd.Timedelta(hours=model.n_obs) if model.start is not None else None
+                if not model.is_trained() or next_hour is None or next_hour < hours[0]:
+                    model.train(revenue, start=hours[0])
+                elif next_hour <= hours[-1]:
+                    model.update(revenue[hours.get_loc(next_hour):])
+            
+            start = model.start + pd.Timedelta(hours=model.n_obs)
+            predictions = []
+            for i, pred in enumerate(model.predict(steps=hours_ahead)):
+                timestamp = start + pd.Timedelta(hours=i)
+                predictions.append({
+                    'timestamp': timestamp.isoformat(),
+                    'date': timestamp.strftime('%Y-%m-%d'),
+                    'hour': timestamp.hour,
+                    'day_of_week': timestamp.strftime('%A'),
+                    'revenue': round(float(pred['prediction']), 2),
+                    'lower_bound': round(float(pred['lower_bound']), 2),
+                    'upper_bound': round(float(pred['upper_bound']), 2),
+                    'orders': int(pred['prediction'] / 65),  # Estimate based on AOV
+                    'confidence': 0.85
+                })
+        
+        self._add_prediction_metadata(predictions)
+        return predictions
+    
     def _simple_prediction(self, days_ahead: int) -> List[Dict[str, Any]]:
         """
         Generate simple predictions based on recent averages
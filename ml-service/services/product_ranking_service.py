@@ -0,0 +1,220 @@
+# ml-service/services/product_ranking_service.py
+import heapq
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+import pandas as pd
+
+from services.data_service import DataService
+from utils.memory import track_stage
+
+logger = logging.getLogger(__name__)
+
+METRICS = ('units', 'revenue', 'growth')
+
+
+class ProductRankingIndex:
+    """
+    Rolling per-product daily sales index for top-N queries
+
+    Units and revenue (in cents, so sums stay exact) are kept as int64
+    prefix sums over days, one row per product. Any window total is then
+    a single column difference, and top-N is a heap selection over the
+    products that sold in the window. Refreshes re-read only the days from
+    the newest one indexed onwards and replace those days' values.
+    """
+
+    def __init__(self):
+        self.data_service = DataService()
+        # Growth over a window compares it with the window before it
+        self.history_days = int(os.getenv('RANKING_HISTORY_DAYS', 730))
+        self.refresh_seconds = int(os.getenv('RANKING_REFRESH_SECONDS', 300))
+
+        self.origin: Optional[date] = None
+        self.n_days = 0
+        self.product_ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.details: List[Dict[str, Any]] = []
+        self.channel_codes = np.zeros(0, dtype=np.int32)
+        self.channels: Dict[str, int] = {}
+        self.prefix_units = np.zeros((0, 1), dtype=np.int64)
+        self.prefix_revenue = np.zeros((0, 1), dtype=np.int64)
+        self.last_refresh = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self) -> Dict[str, Any]:
+        """Fold new and updated order days into the index"""
+        today = date.today()
+        if self.origin is None:
+            since = today - timedelta(days=self.history_days - 1)
+        else:
+            # The newest indexed day may have been partial
+            since = self.origin + timedelta(days=max(self.n_days - 1, 0))
+
+        with track_stage('ranking_refresh'):
+            sales = self.data_service.get_product_daily_sales(
+                datetime.combine(since, datetime.min.time())
+            )
+            with self._lock:
+                if self.origin is None:
+                    self.origin = since
+                self._extend_to(today)
+                self._ingest(sales)
+                self._trim()
+                self.last_refresh = time.time()
+
+        logger.info(f"Ranking index refreshed with {len(sales)} product-days since {since}")
+        return {
+            'product_days': len(sales),
+            'products': len(self.product_ids),
+            'days': self.n_days,
+            'origin': self.origin.isoformat()
+        }
+
+    def refresh_if_stale(self):
+        """Refresh when the index is older than RANKING_REFRESH_SECONDS"""
+        if time.time() - self.last_refresh >= self.refresh_seconds:
+            self.refresh()
+
+    def _extend_to(self, today: date):
+        """Add empty day columns up to and including today"""
+        days = (today - self.origin).days + 1
+        if days <= self.n_days:
+            return
+        extra = days - self.n_days
+        # New days have no sales yet, so their prefix equals the last total
+        self.prefix_units = np.hstack([
+            self.prefix_units, np.repeat(self.prefix_units[:, -1:], extra, axis=1)
+        ])
+        self.prefix_revenue = np.hstack([
+            self.prefix_revenue, np.repeat(self.prefix_revenue[:, -1:], extra, axis=1)
+        ])
+        self.n_days = days
+
+    def _add_products(self, sales: pd.DataFrame):
+        """Register products seen for the first time"""
+        new = sales.drop_duplicates('product_id')
+        new = new[~new['product_id'].astype(str).isin(self.rows)]
+        if new.empty:
+            return
+
+        codes = []
+        for row in new.itertuples(index=False):
+            product_id = str(row.product_id)
+            channel_id = str(row.channel_id)
+            self.rows[product_id] = len(self.product_ids)
+            self.product_ids.append(product_id)
+            self.details.append({
+                'product_id': product_id,
+                'sku': None if pd.isna(row.sku) else row.sku,
+                'title': None if pd.isna(row.title) else row.title,
+                'channel_id': channel_id
+            })
+            codes.append(self.channels.setdefault(channel_id, len(self.channels)))
+
+        self.channel_codes = np.concatenate([self.channel_codes, np.array(codes, dtype=np.int32)])
+        padding = np.zeros((len(codes), self.n_days + 1), dtype=np.int64)
+        self.prefix_units = np.vstack([self.prefix_units, padding])
+        self.prefix_revenue = np.vstack([self.prefix_revenue, padding])
+
+    def _ingest(self, sales: pd.DataFrame):
+        """Replace per-day values for the product-days in `sales`"""
+        if sales.empty:
+            return
+        self._add_products(sales)
+
+        rows = np.fromiter((self.rows[str(p)] for p in sales['product_id']),
+                           dtype=np.int64, count=len(sales))
+        days = (pd.to_datetime(sales['date']) - pd.Timestamp(self.origin)).dt.days.to_numpy()
+        keep = (days >= 0) & (days < self.n_days)
+        rows, days = rows[keep], days[keep]
+
+        affected, local = np.unique(rows, return_inverse=True)
+        for prefix, values in (
+            (self.prefix_units, sales['units'].to_numpy(np.int64)[keep]),
+            (self.prefix_revenue, sales['revenue_cents'].to_numpy(np.int64)[keep])
+        ):
+            # Delta against what is stored turns the refresh into a replace
+            current = prefix[rows, days + 1] - prefix[rows, days]
+            delta = np.zeros((len(affected), self.n_days), dtype=np.int64)
+            np.add.at(delta, (local, days), values - current)
+            prefix[affected, 1:] += np.cumsum(delta, axis=1)
+
+    def _trim(self):
+        """Drop days older than the history window"""
+        excess = self.n_days - self.history_days
+        if excess <= 0:
+            return
+        self.prefix_units = self.prefix_units[:, excess:] - self.prefix_units[:, excess:excess + 1]
+        self.prefix_revenue = self.prefix_revenue[:, excess:] - self.prefix_revenue[:, excess:excess + 1]
+        self.origin += timedelta(days=excess)
+        self.n_days -= excess
+
+    def _window_totals(self, prefix: np.ndarray, window_days: int, offset: int = 0) -> np.ndarray:
+        """Per-product totals over the window ending `offset` windows back"""
+        end = self.n_days - offset * window_days
+        start = max(end - window_days, 0)
+        if end <= 0:
+            return np.zeros(len(prefix), dtype=np.int64)
+        return prefix[:, end] - prefix[:, start]
+
+    def top(self, metric: str = 'units', window_days: int = 30, limit: int = 20,
+            channel_id: Optional[str] = None, min_base_units: int = 1) -> List[Dict[str, Any]]:
+        """
+        Top products by units, revenue or growth over a trailing window
+
+        Args:
+            metric: units, revenue or growth (vs the previous window)
+            window_days: Window length ending today
+            limit: Number of products to return
+            channel_id: Restrict to one channel
+            min_base_units: Units needed in the previous window to rank by growth
+
+        Returns:
+            Ranked products with window totals and growth
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric: {metric}")
+        # Growth also needs the window before this one
+        max_window = self.history_days // 2 if metric == 'growth' else self.history_days
+        if not 1 <= window_days <= max_window:
+            raise ValueError(f"Window for {metric} must be between 1 and {max_window} days")
+
+        with self._lock:
+            units = self._window_totals(self.prefix_units, window_days)
+            revenue = self._window_totals(self.prefix_revenue, window_days)
+            prev_units = self._window_totals(self.prefix_units, window_days, offset=1)
+
+            growth = np.full(len(units), np.nan)
+            based = prev_units >= max(min_base_units, 1)
+            growth[based] = (units[based] - prev_units[based]) / prev_units[based] * 100
+
+            mask = units > 0
+            if metric == 'growth':
+                mask = based
+            if channel_id is not None:
+                code = self.channels.get(channel_id)
+                if code is None:
+                    return []
+                mask &= self.channel_codes == code
+
+            scores = {'units': units, 'revenue': revenue, 'growth': growth}[metric]
+            candidates = np.flatnonzero(mask)
+            best = heapq.nlargest(limit, candidates.tolist(), key=scores.__getitem__)
+
+            return [
+                {
+                    **self.details[row],
+                    'rank': rank,
+                    'units': int(units[row]),
+                    'revenue': round(revenue[row] / 100.0, 2),
+                    'previous_units': int(prev_units[row]),
+                    'growth_pct': None if np.isnan(growth[row]) else round(float(growth[row]), 2)
+                }
+                for rank, row in enumerate(best, start=1)
+            ]
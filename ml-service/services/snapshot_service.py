@@ -0,0 +1,201 @@
+# ml-service/services/snapshot_service.py
+import logging
+import os
+import shutil
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Any
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from services.data_service import DataService
+from utils.memory import chunk_size, track_stage
+
+logger = logging.getLogger(__name__)
+
+# Source query and Parquet schema per snapshotted table. Explicit schemas
+# keep chunk files consistent even when a chunk is all NULL in a column.
+# Orders and their items are partitioned by order month so analytics
+# queries can prune by date.
+TABLES = {
+    'orders': {
+        'query': """
+            SELECT
+                o.id,
+                o.channel_id,
+                o.created_at,
+                o.total_cents,
+                TO_CHAR(o.created_at, 'YYYY-MM') as month
+            FROM orders o
+            WHERE o.created_at >= %s
+        """,
+        'schema': pa.schema([
+            ('id', pa.string()),
+            ('channel_id', pa.string()),
+            ('created_at', pa.timestamp('us')),
+            ('total_cents', pa.int64()),
+            ('month', pa.string())
+        ]),
+        'partitioned': True
+    },
+    'order_items': {
+        'query': """
+            SELECT
+                oi.id,
+                oi.order_id,
+                oi.product_id,
+                oi.quantity,
+                oi.total_cents,
+                TO_CHAR(o.created_at, 'YYYY-MM') as month
+            FROM order_items oi
+            JOIN orders o ON oi.order_id = o.id
+            WHERE o.created_at >= %s
+        """,
+        'schema': pa.schema([
+            ('id', pa.string()),
+            ('order_id', pa.string()),
+            ('product_id', pa.string()),
+            ('quantity', pa.int64()),
+            ('total_cents', pa.int64()),
+            ('month', pa.string())
+        ]),
+        'partitioned': True
+    },
+    'products': {
+        'query': """
+            SELECT
+                p.id,
+                p.channel_id,
+                p.sku,
+                p.title,
+                p.active
+            FROM products p
+        """,
+        'schema': pa.schema([
+            ('id', pa.string()),
+            ('channel_id', pa.string()),
+            ('sku', pa.string()),
+            ('title', pa.string()),
+            ('active', pa.bool_())
+        ]),
+        'partitioned': False
+    }
+}
+
+
+class SnapshotService:
+    """
+    Copies orders, order items and products from Postgres into Parquet
+
+    Month partitions from the newest one already on disk onwards are
+    re-extracted on every run (the current month is still changing); older
+    months are left alone. Products are small and rewritten in full. New
+    data is written to a staging area first and swapped in per partition;
+    replaced partitions are only deleted after the swap.
+    """
+
+    def __init__(self):
+        self.data_service = DataService()
+        self.snapshot_dir = self.data_service.snapshot_dir
+        self.history_days = int(os.getenv('SNAPSHOT_HISTORY_DAYS', 730))
+        self.chunk_size = int(os.getenv('SNAPSHOT_CHUNK_SIZE', chunk_size(100000)))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Refresh all snapshot tables and return rows written per table"""
+        since = self._resume_from()
+        run_id = uuid.uuid4().hex[:8]
+        staging = os.path.join(self.snapshot_dir, '_staging', run_id)
+
+        results = {}
+        try:
+            for table, spec in TABLES.items():
+                params = [since] if spec['partitioned'] else []
+                with track_stage(f'snapshot_{table}'):
+                    results[table] = self._extract(table, spec, params, staging, run_id)
+                self._publish(table, spec, staging)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+            try:
+                os.rmdir(os.path.dirname(staging))
+            except OSError:
+                pass
+
+        logger.info(f"Snapshot from {since:%Y-%m-%d} written: {results}")
+        return {
+            'since': since.isoformat(),
+            'rows': results,
+            'timestamp': datetime.now().isoformat()
+        }
+
+    def _resume_from(self) -> datetime:
+        """Start of the newest order month on disk, or the full history window"""
+        orders_dir = os.path.join(self.snapshot_dir, 'orders')
+        months = sorted(
+            name.split('=', 1)[1]
+            for name in os.listdir(orders_dir) if name.startswith('month=')
+        ) if os.path.isdir(orders_dir) else []
+
+        if months:
+            return datetime.strptime(months[-1], '%Y-%m')
+        start = datetime.now() - timedelta(days=self.history_days)
+        return start.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    def _extract(self, table, spec, params, staging, run_id) -> int:
+        """Stream one table from Postgres into staged Parquet files"""
+        target = os.path.join(staging, table)
+        os.makedirs(target, exist_ok=True)
+        rows = 0
+
+        for i, chunk in enumerate(self.data_service.stream_query(
+            spec['query'], params, spec['schema'].names, self.chunk_size
+        )):
+            arrow_table = pa.Table.from_pandas(chunk, schema=spec['schema'], preserve_index=False)
+            if spec['partitioned']:
+                pq.write_to_dataset(
+                    arrow_table,
+                    root_path=target,
+                    partition_cols=['month'],
+                    basename_template=f'part-{run_id}-{i}-{{i}}.parquet',
+                    existing_data_behavior='overwrite_or_ignore'
+                )
+            else:
+                pq.write_table(arrow_table, os.path.join(target, f'part-{i}.parquet'))
+            rows += len(chunk)
+
+        return rows
+
+    def _publish(self, table, spec, staging):
+        """
+        Swap staged partitions (or the whole unpartitioned table) into place
+
+        The live directory is renamed aside before the staged one is renamed
+        in, so readers never see a partition missing for longer than
+        between two renames. Retired directories are moved under the
+        staging area (outside every read_parquet glob) and deleted with it
+        once the whole snapshot is published.
+        """
+        source = os.path.join(staging, table)
+        target = os.path.join(self.snapshot_dir, table)
+        retired = os.path.join(staging, '_retired', table)
+        os.makedirs(retired, exist_ok=True)
+
+        if not spec['partitioned']:
+            # Replace the table only if the extract produced data
+            if os.listdir(source):
+                self._swap(source, target, os.path.join(retired, 'table'))
+            return
+
+        os.makedirs(target, exist_ok=True)
+        for partition in os.listdir(source):
+            self._swap(
+                os.path.join(source, partition),
+                os.path.join(target, partition),
+                os.path.join(retired, partition)
+            )
+
+    def _swap(self, source, destination, retired):
+        """Rename destination aside (if present), then source into its place"""
+        if os.path.exists(destination):
+            os.replace(destination, retired)
+        os.replace(source, destination)
@@ -0,0 +1,312 @@
+# ml-service/services/stockout_simulator.py
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+import pandas as pd
+
+from services.data_service import DataService
+from services.lead_time_service import LeadTimeService
+from utils.memory import current_rss_mb, memory_budget_mb, track_stage
+
+logger = logging.getLogger(__name__)
+
+# Approximate peak bytes per simulated day per path of one SKU: float32
+# rates and gamma draws, int64 Poisson draws and their float32 copy, the
+# running position and a bool mask.
+_BYTES_PER_PATH_DAY = 32
+
+
+def _simulate_chunk(args) -> Dict[str, np.ndarray]:
+    """
+    Simulate one chunk of SKUs under lost-sales dynamics.
+
+    Runs in a worker process, so it only takes and returns plain arrays.
+    Demand is negative binomial (gamma-Poisson mixture) per day. Each SKU
+    draws from its own seed, so results do not depend on how the catalog
+    is chunked. With lost sales, stock is the running position
+    on_hand + cumsum(receipts - demand) reflected at zero, so a whole
+    horizon is simulated with cumulative sums instead of a day loop.
+    """
+    on_hand, receipts, mean, variance, n_paths, seeds = args
+    n_skus, horizon = receipts.shape
+    # Interpreter and imports alone, before any simulation arrays
+    baseline_rss = current_rss_mb()
+
+    stockout_probability = np.zeros(n_skus, dtype=np.float64)
+    # NaN where no path stocks out within the horizon
+    days_to_stockout = np.full(n_skus, np.nan, dtype=np.float64)
+    fill_rate = np.ones(n_skus, dtype=np.float64)
+    ending_stock = np.zeros(n_skus, dtype=np.float64)
+
+    for i in range(n_skus):
+        rng = np.random.default_rng(seeds[i])
+        lam = np.full((horizon, n_paths), mean[i], dtype=np.float32)
+        # Gamma mixing when overdispersed, plain Poisson otherwise
+        if variance[i] > mean[i] > 0:
+            dispersion = (variance[i] - mean[i]) / mean[i] ** 2
+            lam *= rng.standard_gamma(
+                1.0 / dispersion, size=(horizon, n_paths), dtype=np.float32
+            ) * np.float32(dispersion)
+        demand = rng.poisson(lam).astype(np.float32)
+        del lam
+
+        # Scheduled receipts land at the start of the day
+        position = np.cumsum(receipts[i][:, None] - demand, axis=0)
+        position += on_hand[i]
+        total_demand = demand.sum(dtype=np.float64)
+        del demand
+
+        # A path is short on the first day its unreflected position goes
+        # negative; before that it has never been clipped at zero
+        short = position < 0
+        stocked_out = short.any(axis=0)
+        first_stockout = short.argmax(axis=0)
+        del short
+
+        # Reflecting at zero lifts the end position by the deepest shortfall
+        ending = position[-1] - np.minimum(position.min(axis=0), 0)
+        del position
+
+        sold = (on_hand[i] + receipts[i].sum()) * n_paths - ending.sum(dtype=np.float64)
+        stockout_probability[i] = stocked_out.mean()
+        if stocked_out.any():
+            days_to_stockout[i] = first_stockout[stocked_out].mean(dtype=np.float64)
+        if total_demand > 0:
+            fill_rate[i] = sold / total_demand
+        ending_stock[i] = ending.mean(dtype=np.float64)
+
+    return {
+        'stockout_probability': stockout_probability,
+        'expected_days_to_stockout': days_to_stockout,
+        'fill_rate': fill_rate,
+        'expected_ending_stock': ending_stock,
+        'worker_baseline_mb': np.array([baseline_rss])
+    }
+
+
+class StockoutSimulator:
+    """Monte Carlo stockout-risk simulation over the whole catalog"""
+
+    # Risk levels by stockout probability over the horizon
+    RISK_THRESHOLDS = [
+        (0.75, 'critical'),
+        (0.50, 'high'),
+        (0.20, 'medium')
+    ]
+
+    def __init__(self):
+        self.data_service = DataService()
+        self.lead_time_service = LeadTimeService()
+        self.n_paths = int(os.getenv('STOCKOUT_SIM_PATHS', 20000))
+        self.horizon_days = int(os.getenv('STOCKOUT_SIM_HORIZON_DAYS', 60))
+        self.memory_budget_mb = int(os.getenv('STOCKOUT_SIM_MEMORY_MB', memory_budget_mb() // 3))
+        self.max_workers = int(os.getenv('STOCKOUT_SIM_WORKERS', os.cpu_count() or 1))
+        # RSS of a freshly spawned worker before it allocates anything;
+        # replaced by the largest value measured once workers have run
+        self.worker_baseline_mb = float(os.getenv('STOCKOUT_SIM_WORKER_BASELINE_MB', 150))
+
+    def run(self, n_paths: Optional[int] = None, horizon_days: Optional[int] = None,
+            history_days: int = 90, forecasts: Optional[Dict[str, float]] = None,
+            seed: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Simulate stockout risk for every active product
+
+        Args:
+            n_paths: Demand paths simulated per SKU
+            horizon_days: Number of days to simulate
+            history_days: Days of sales history used to estimate demand
+            forecasts: Optional mean daily units per product_id overriding history
+            seed: Seed for reproducible runs
+
+        Returns:
+            One result per product with stockout probability, expected
+            days to stockout among paths that stock out (None if none do)
+            and fill rate
+        """
+        n_paths = n_paths or self.n_paths
+        horizon = horizon_days or self.horizon_days
+
+        with track_stage('stockout_load'):
+            positions = self.data_service.get_inventory_positions()
+            if positions.empty:
+                return []
+
+            demand = self.data_service.get_product_daily_demand(days=history_days)
+            open_pos = self.data_service.get_open_purchase_orders()
+
+        mean, variance = self._demand_moments(positions, demand, history_days)
+        if forecasts:
+            override = positions['product_id'].map(forecasts)
+            has_forecast = override.notna().to_numpy()
+            # Keep the historical dispersion ratio around the forecast mean
+            ratio = np.divide(variance, mean, out=np.ones_like(mean), where=mean > 0)
+            mean = np.where(has_forecast, override.fillna(0).to_numpy(np.float32), mean)
+            variance = np.where(has_forecast, mean * np.maximum(ratio, 1.0), variance)
+
+        lead_times = self._lead_times(positions)
+        receipts = self._receipt_schedule(positions, open_pos, horizon, lead_times)
+        on_hand = positions['on_hand'].clip(lower=0).to_numpy(np.float32)
+
+        with track_stage('stockout_simulate', children=True):
+            results = self._simulate(on_hand, receipts, mean.astype(np.float32),
+                                     variance.astype(np.float32), n_paths, seed)
+
+        days_to_stockout = results['expected_days_to_stockout']
+        output = []
+        for i, row in enumerate(positions.itertuples(index=False)):
+            probability = float(results['stockout_probability'][i])
+            output.append({
+                'product_id': row.product_id,
+                'sku': row.sku,
+                'on_hand': int(on_hand[i]),
+                'scheduled_receipts': int(receipts[i].sum()),
+                'lead_time_days': int(lead_times[i]),
+                'mean_daily_demand': round(float(mean[i]), 3),
+                'stockout_probability': round(probability, 4),
+                'expected_days_to_stockout': None if np.isnan(days_to_stockout[i])
+                    else round(float(days_to_stockout[i]), 2),
+                'fill_rate': round(float(results['fill_rate'][i]), 4),
+                'expected_ending_stock': round(float(results['expected_ending_stock'][i]), 2),
+                'stockout_risk': self._risk_level(probability)
+            })
+
+        return output
+
+    def _demand_moments(self, positions: pd.DataFrame, demand: pd.DataFrame,
+                        history_days: int):
+        """Mean and variance of daily units per product, counting zero-sale days"""
+        n = len(positions)
+        if demand.empty:
+            zeros = np.zeros(n, dtype=np.float64)
+            return zeros, zeros.copy()
+
+        index = pd.Index(positions['product_id'])
+        rows = index.get_indexer(demand['product_id'])
+        known = rows >= 0
+        rows = rows[known]
+        units = demand['units'].to_numpy(np.float64)[known]
+
+        sums = np.bincount(rows, weights=units, minlength=n)
+        sq_sums = np.bincount(rows, weights=units * units, minlength=n)
+
+        mean = sums / history_days
+        variance = np.maximum(sq_sums / history_days - mean * mean, 0.0)
+        return mean, variance
+
+    def _lead_times(self, positions: pd.DataFrame) -> np.ndarray:
+        """
+        Lead time per product in whole days
+
+        Uses the mean of the fitted supplier-product (or supplier) lead-time
+        distribution, falling back to the product's configured lead time
+        when there are too few receipts to fit one.
+        """
+        lead = positions['lead_time_days'].to_numpy(np.int64).copy()
+        if 'supplier_id' not in positions:
+            return lead
+        for i, (supplier_id, product_id) in enumerate(
+            zip(positions['supplier_id'], positions['product_id'])
+        ):
+            if supplier_id is None or pd.isna(supplier_id):
+                continue
+            dist = self.lead_time_service.get_distribution(supplier_id, product_id)
+            if dist['level'] != 'default':
+                lead[i] = int(round(dist['mean_days']))
+        return lead
+
+    def _receipt_schedule(self, positions: pd.DataFrame, open_pos: pd.DataFrame,
+                          horizon: int, lead_times: np.ndarray) -> np.ndarray:
+        """Units arriving per product per simulated day"""
+        n = len(positions)
+        receipts = np.zeros((n, horizon), dtype=np.float32)
+        index = pd.Index(positions['product_id'])
+        today = pd.Timestamp(datetime.now().date())
+
+        covered = np.zeros(n, dtype=bool)
+        if not open_pos.empty:
+            rows = index.get_indexer(open_pos['product_id'])
+            expected = pd.to_datetime(open_pos['expected_date'])
+            # Overdue or undated lines are assumed to arrive tomorrow
+            days = ((expected - today).dt.days.fillna(1).clip(lower=1) - 1).to_numpy(np.int64)
+            valid = (rows >= 0) & (days < horizon)
+            np.add.at(
+                receipts,
+                (rows[valid], days[valid]),
+                open_pos['quantity_open'].to_numpy(np.float32)[valid]
+            )
+            covered[rows[rows >= 0]] = True
+
+        # Incoming stock not backed by an open PO line arrives after the
+        # product's lead time
+        incoming = positions['incoming'].to_numpy(np.float32)
+        lead = lead_times.clip(1, None) - 1
+        fallback = ~covered & (incoming > 0) & (lead < horizon)
+        receipts[np.flatnonzero(fallback), lead[fallback]] += incoming[fallback]
+
+        return receipts
+
+    def _max_workers(self, n_paths: int, horizon: int) -> int:
+        """
+        Workers that fit in the budget, each simulating one SKU at a time
+
+        Every spawned worker costs its own interpreter and imports on top of
+        the simulation arrays; a single worker runs in this process instead.
+        """
+        arrays_mb = horizon * n_paths * _BYTES_PER_PATH_DAY / 1024 / 1024
+        if arrays_mb > self.memory_budget_mb:
+            logger.warning(
+                f"One SKU x {n_paths} paths x {horizon} days needs "
+                f"{arrays_mb:.0f} MB, over the simulation budget"
+            )
+        fits = int(self.memory_budget_mb // (self.worker_baseline_mb + arrays_mb))
+        return max(1, min(self.max_workers, fits))
+
+    def _simulate(self, on_hand, receipts, mean, variance, n_paths, seed):
+        """Split the catalog into chunks and simulate them in parallel"""
+        n, horizon = receipts.shape
+        workers = max(1, min(self._max_workers(n_paths, horizon), n))
+        # A few chunks per worker keeps workers busy when SKUs differ in cost
+        chunk = max(1, -(-n // (workers * 4)))
+        bounds = [(start, min(start + chunk, n)) for start in range(0, n, chunk)]
+        # One seed per SKU so results are the same for any chunking or worker count
+        seeds = np.random.SeedSequence(seed).spawn(n)
+
+        tasks = [
+            (on_hand[a:b], receipts[a:b], mean[a:b], variance[a:b], n_paths, seeds[a:b])
+            for a, b in bounds
+        ]
+
+        logger.info(
+            f"Simulating {n} SKUs x {n_paths} paths in {len(tasks)} chunks "
+            f"of up to {chunk} SKUs on {workers} workers"
+        )
+
+        if workers == 1 or len(tasks) == 1:
+            parts = [_simulate_chunk(task) for task in tasks]
+        else:
+            # Forking a threaded Flask/APScheduler process can copy held locks
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                parts = list(pool.map(_simulate_chunk, tasks))
+            self.worker_baseline_mb = max(
+                float(part.pop('worker_baseline_mb').max()) for part in parts
+            )
+
+        for part in parts:
+            part.pop('worker_baseline_mb', None)
+        return {
+            key: np.concatenate([part[key] for part in parts])
+            for key in parts[0]
+        }
+
+    def _risk_level(self, probability: float) -> str:
+        """Map a stockout probability to the backend's risk labels"""
+        for threshold, level in self.RISK_THRESHOLDS:
+            if probability >= threshold:
+                return level
+        return 'low'
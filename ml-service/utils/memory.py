@@ -0,0 +1,138 @@
+# ml-service/utils/memory.py
+import logging
+import os
+import resource
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Any
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Latest measurement per pipeline stage, served by /api/v1/ml/memory
+STAGE_REPORT: Dict[str, Dict[str, Any]] = {}
+
+# tracemalloc state is process-global, so stages take turns tracing and
+# a traced peak is only kept when no other stage overlapped it
+_tracing_lock = threading.Lock()
+_stage_lock = threading.Lock()
+_stages = {'active': 0, 'started': 0}
+
+
+def memory_budget_mb() -> int:
+    """Memory the ML pipeline may use (ML_MEMORY_BUDGET_MB, default fits a 2 GB container)"""
+    return int(os.getenv('ML_MEMORY_BUDGET_MB', 1536))
+
+
+def chunk_size(default: int = 50000) -> int:
+    """Rows or series processed per chunk (ML_CHUNK_SIZE)"""
+    return int(os.getenv('ML_CHUNK_SIZE', default))
+
+
+def current_rss_mb() -> float:
+    """Resident set size of this process"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError):
+        return 0.0
+
+
+def peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    """High-water RSS of this process, or of its largest reaped child"""
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+@contextmanager
+def track_stage(name: str, children: bool = False):
+    """
+    Record peak memory, RSS and duration of a pipeline stage
+
+    The kernel's RSS high-water mark only ever rises, so the stage reports
+    the process peak at its end and how far the stage pushed it up (0 when
+    it stayed under an earlier peak). Stages that run their work in worker
+    processes pass children=True to also report the largest worker's peak.
+    The kernel only keeps the largest peak of any child reaped so far, so
+    it is reported only when one of this stage's workers set a new high;
+    workers must have exited (e.g. the pool shut down) by the end of the
+    stage to be counted.
+
+    Allocation tracing is only switched on when ML_TRACK_MEMORY=true since
+    it slows allocation-heavy code. tracemalloc's peak counts every
+    thread, so a traced peak is only reported for stages that no other
+    stage overlapped (in another thread or nested).
+    """
+    with _stage_lock:
+        alone = _stages['active'] == 0
+        _stages['active'] += 1
+        _stages['started'] += 1
+        started_count = _stages['started']
+
+    tracing = (os.getenv('ML_TRACK_MEMORY', 'false').lower() == 'true'
+               and _tracing_lock.acquire(blocking=False))
+    started_tracing = tracing and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    if tracing:
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+
+    peak_before = peak_rss_mb()
+    if children:
+        children_before = peak_rss_mb(resource.RUSAGE_CHILDREN)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _stage_lock:
+            _stages['active'] -= 1
+            overlapped = not alone or _stages['started'] != started_count
+
+        peak_after = peak_rss_mb()
+        report = {
+            'seconds': round(time.perf_counter() - started, 3),
+            'rss_mb': round(current_rss_mb(), 1),
+            'peak_rss_mb': round(peak_after, 1),
+            'peak_rss_increase_mb': round(peak_after - peak_before, 1)
+        }
+        if children:
+            children_after = peak_rss_mb(resource.RUSAGE_CHILDREN)
+            if children_after > children_before:
+                report['worker_peak_rss_mb'] = round(children_after, 1)
+        if tracing:
+            _, peak = tracemalloc.get_traced_memory()
+            if not overlapped:
+                report['peak_mb'] = round((peak - base) / 1024 / 1024, 1)
+            if started_tracing:
+                tracemalloc.stop()
+            _tracing_lock.release()
+
+        STAGE_REPORT[name] = report
+        logger.info(f"Stage {name}: {report}")
+        if max(report['peak_rss_mb'], report.get('worker_peak_rss_mb', 0)) > memory_budget_mb():
+            logger.warning(f"Stage {name} exceeded memory budget of {memory_budget_mb()} MB")
+
+
+def compact_frame(df: pd.DataFrame, id_columns=()) -> pd.DataFrame:
+    """
+    Downcast a query result in place to float32/int32 and categorical ids
+
+    Integer columns whose values do not fit in int32 are left as they are.
+    """
+    int32 = np.iinfo(np.int32)
+    for column in df.columns:
+        values = df[column]
+        if column in id_columns:
+            df[column] = values.astype('category')
+        elif pd.api.types.is_float_dtype(values.dtype):
+            df[column] = values.astype(np.float32, copy=False)
+        elif pd.api.types.is_integer_dtype(values.dtype):
+            if values.empty or (values.min() >= int32.min and values.max() <= int32.max):
+                df[column] = values.astype(np.int32, copy=False)
+    return df
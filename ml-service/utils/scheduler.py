@@ -0,0 +1,383 @@
+# ml-service/utils/scheduler.py
+import heapq
+import logging
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Any, List, Optional
+
+from apscheduler.schedulers.background import BackgroundScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class SeriesStats:
+    """Incrementally updated error and drift statistics for one series"""
+
+    # Observations needed before the reference distribution is trusted
+    MIN_REFERENCE = 14
+    # Forecast outcomes averaged into a freshly trained model's baseline error
+    MIN_BASELINE = 7
+    # Floor on the baseline so near-perfect fits do not make any error look huge
+    MIN_BASELINE_ERROR = 0.01
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        # Exponentially weighted absolute percentage error since last train
+        self.error = None
+        self.error_n = 0
+        # Error level right after the last train, used as the baseline
+        self.baseline_error = None
+        # Running (n, mean, M2) of the first observations after the last
+        # train, i.e. the level the current model was fitted to
+        self.reference = (0, 0.0, 0.0)
+        # Exponentially weighted mean of data seen after the reference
+        self.recent_mean = None
+        self.observations = 0
+        self.last_trained = None
+        self.train_seconds = None
+
+    def update_error(self, predicted: float, actual: float):
+        """Fold one forecast/actual pair into the error average"""
+        denom = abs(actual) if actual else max(abs(predicted), 1.0)
+        ape = abs(actual - predicted) / denom
+        self.error_n += 1
+        if self.error is None:
+            self.error = ape
+        elif self.error_n <= self.MIN_BASELINE:
+            # Plain mean until the baseline is set, then exponential weighting
+            self.error += (ape - self.error) / self.error_n
+        else:
+            self.error += self.alpha * (ape - self.error)
+        if self.error_n == self.MIN_BASELINE:
+            self.baseline_error = max(self.error, self.MIN_BASELINE_ERROR)
+
+    def update_value(self, value: float):
+        """Fold one new observation into the drift statistics"""
+        self.observations += 1
+        if self.last_trained is None or self.reference[0] < self.MIN_REFERENCE:
+            self.reference = _welford_add(self.reference, value)
+            return
+        if self.recent_mean is None:
+            self.recent_mean = value
+        else:
+            self.recent_mean += self.alpha * (value - self.recent_mean)
+
+    def drift(self) -> float:
+        """Shift of the recent mean from the reference mean, in reference std units"""
+        n, mean, m2 = self.reference
+        if self.recent_mean is None or n < 2:
+            return 0.0
+        std = math.sqrt(m2 / (n - 1))
+        if std == 0:
+            return 0.0 if self.recent_mean == mean else float('inf')
+        return abs(self.recent_mean - mean) / std
+
+    def error_ratio(self) -> float:
+        """Current error relative to the post-train baseline"""
+        if self.error is None or self.baseline_error is None:
+            return 1.0
+        return self.error / self.baseline_error
+
+    def mark_trained(self, seconds: Optional[float] = None):
+        """
+        Reset statistics for a freshly trained model
+
+        The reference is rebuilt from the next MIN_REFERENCE observations.
+        Merging the pre-train data into it instead would keep the old level
+        in its mean and inflate its std after every shift, making drift
+        re-trigger and then go blind.
+        """
+        self.reference = (0, 0.0, 0.0)
+        self.recent_mean = None
+        # The new model sets its own baseline from its first errors
+        self.error = None
+        self.error_n = 0
+        self.baseline_error = None
+        self.last_trained = datetime.now()
+        if seconds is None:
+            return
+        if self.train_seconds is None:
+            self.train_seconds = seconds
+        else:
+            self.train_seconds += 0.5 * (seconds - self.train_seconds)
+
+
+def _welford_add(state, value: float):
+    n, mean, m2 = state
+    n += 1
+    delta = value - mean
+    mean += delta / n
+    return n, mean, m2 + delta * (value - mean)
+
+
+class RetrainScheduler:
+    """
+    Retrain only the series whose error or input data drifted
+
+    Each cycle scores every tracked series, pushes the ones over threshold
+    onto a priority queue and retrains the worst first until the cycle's
+    time budget is spent. Jobs run in a worker pool.
+    """
+
+    def __init__(self, retrain_fn: Callable[[str], Any],
+                 collect_fn: Optional[Callable[['RetrainScheduler'], None]] = None,
+                 error_threshold: float = 1.5, drift_threshold: float = 3.0,
+                 budget_seconds: float = 600, max_workers: int = 2,
+                 alpha: float = 0.1, default_train_seconds: float = 60):
+        self.retrain_fn = retrain_fn
+        self.collect_fn = collect_fn
+        self.error_threshold = error_threshold
+        self.drift_threshold = drift_threshold
+        self.budget_seconds = budget_seconds
+        self.max_workers = max_workers
+        self.alpha = alpha
+        self.default_train_seconds = default_train_seconds
+        self.series: Dict[str, SeriesStats] = {}
+        self.last_cycle: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+
+    def track(self, series_id: str) -> SeriesStats:
+        """Statistics for a series, registering it if it is new"""
+        if series_id not in self.series:
+            self.series[series_id] = SeriesStats(self.alpha)
+        return self.series[series_id]
+
+    def record_forecast(self, series_id: str, predicted: float, actual: float):
+        """Record a forecast once its actual value is known"""
+        with self._lock:
+            self._tracked(series_id).update_error(predicted, actual)
+
+    def record_observation(self, series_id: str, value: float):
+        """Record a new data point for drift detection"""
+        with self._lock:
+            self._tracked(series_id).update_value(value)
+
+    def _tracked(self, series_id: str) -> SeriesStats:
+        """Statistics for a registered series; unknown ids are rejected"""
+        # Auto-registering would queue typos as never-trained series
+        if series_id not in self.series:
+            raise KeyError(f"Unknown series: {series_id}")
+        return self.series[series_id]
+
+    def score(self, series_id: str) -> float:
+        """Priority score; at or above 1.0 means a threshold was crossed"""
+        stats = self.series[series_id]
+        if stats.last_trained is None:
+            return float('inf')
+        return max(
+            stats.error_ratio() / self.error_threshold,
+            stats.drift() / self.drift_threshold
+        )
+
+    def run_cycle(self) -> Dict[str, Any]:
+        """Retrain the highest-priority drifted series within the time budget"""
+        if self.collect_fn:
+            try:
+                self.collect_fn(self)
+            except Exception as e:
+                logger.error(f"Collecting monitoring data failed: {e}")
+
+        with self._lock:
+            queue = []
+            for series_id in self.series:
+                score = self.score(series_id)
+                if score >= 1.0:
+                    heapq.heappush(queue, (-score, series_id))
+
+        started = time.monotonic()
+        planned = 0.0
+        selected: List[str] = []
+        skipped: List[str] = []
+
+        while queue:
+            _, series_id = heapq.heappop(queue)
+            cost = self.series[series_id].train_seconds or self.default_train_seconds
+            # Jobs run in parallel, so the budget covers all workers' time
+            if selected and planned + cost > self.budget_seconds * self.max_workers:
+                skipped.append(series_id)
+                continue
+            planned += cost
+            selected.append(series_id)
+
+        futures = {
+            series_id: self._pool.submit(self._retrain, series_id)
+            for series_id in selected
+        }
+
+        results = {}
+        for series_id, future in futures.items():
+            try:
+                results[series_id] = future.result()
+            except Exception as e:
+                logger.error(f"Retraining {series_id} failed: {e}")
+                results[series_id] = {'success': False, 'error': str(e)}
+
+        self.last_cycle = {
+            'timestamp': datetime.now().isoformat(),
+            'retrained': selected,
+            'deferred': skipped,
+            'elapsed_seconds': round(time.monotonic() - started, 2),
+            'results': results
+        }
+        logger.info(
+            f"Retrain cycle: {len(selected)} retrained, {len(skipped)} deferred "
+            f"in {self.last_cycle['elapsed_seconds']}s"
+        )
+        return self.last_cycle
+
+    def _retrain(self, series_id: str) -> Dict[str, Any]:
+        started = time.monotonic()
+        self.retrain_fn(series_id)
+        seconds = time.monotonic() - started
+        with self._lock:
+            self.series[series_id].mark_trained(seconds)
+        return {'success': True, 'seconds': round(seconds, 2)}
+
+    def get_status(self) -> Dict[str, Any]:
+        """Current statistics and score for every tracked series"""
+        with self._lock:
+            series = [
+                {
+                    'series_id': series_id,
+                    'score': _json_score(self.score(series_id)),
+                    'error': stats.error,
+                    'baseline_error': stats.baseline_error,
+                    'drift': _json_score(stats.drift()),
+                    'observations': stats.observations,
+                    'last_trained': stats.last_trained.isoformat() if stats.last_trained else None,
+                    'train_seconds': stats.train_seconds
+                }
+                for series_id, stats in self.series.items()
+            ]
+        return {'series': series, 'last_cycle': self.last_cycle}
+
+
+def _json_score(score: float) -> Optional[float]:
+    """Never-trained series score infinite, which JSON cannot carry"""
+    return None if math.isinf(score) else round(score, 4)
+
+
+def _collect_daily_revenue(data_service):
+    """Build a collector feeding each new complete day of revenue to every series"""
+    state = {'last_date': None}
+
+    def collect(retrain_scheduler: RetrainScheduler):
+        df = data_service.get_historical_data(days=7)
+        if df.empty:
+            return
+        # The current day is still accumulating orders
+        complete = df[df['date'] < datetime.now().date().isoformat()]
+        if state['last_date'] is not None:
+            complete = complete[complete['date'] > state['last_date']]
+        for row in complete.itertuples(index=False):
+            for series_id in list(retrain_scheduler.series):
+                retrain_scheduler.record_observation(series_id, float(row.revenue))
+            state['last_date'] = row.date
+
+    return collect
+
+
+def start_scheduler(training_service, data_service=None,
+                    series_ids: Optional[List[str]] = None) -> Optional[RetrainScheduler]:
+    """
+    Start the background change-detection retraining loop
+
+    Args:
+        training_service: Service exposing retrain_models(models, force)
+        data_service: Source of new daily revenue for drift detection
+        series_ids: Series to track (defaults to the forecasting models)
+
+    Returns:
+        The running RetrainScheduler, or None if there is nothing to retrain
+    """
+    if training_service is None:
+        logger.warning("Training service not available, scheduler not started")
+        return None
+
+    retrain_scheduler = RetrainScheduler(
+        retrain_fn=lambda series_id: training_service.retrain_models(
+            models=[series_id], force=True
+        ),
+        collect_fn=_collect_daily_revenue(data_service) if data_service else None,
+        error_threshold=float(os.getenv('RETRAIN_ERROR_THRESHOLD', 1.5)),
+        drift_threshold=float(os.getenv('RETRAIN_DRIFT_THRESHOLD', 3.0)),
+        budget_seconds=float(os.getenv('RETRAIN_BUDGET_SECONDS', 600)),
+        max_workers=int(os.getenv('RETRAIN_WORKERS', 2))
+    )
+    for series_id in series_ids or ['arima', 'lstm']:
+        stats = retrain_scheduler.track(series_id)
+        # Models already on disk start monitored rather than queued
+        if training_service.model_exists(series_id):
+            stats.mark_trained()
+
+    interval = int(os.getenv('MODEL_UPDATE_INTERVAL', 86400))
+    background = BackgroundScheduler(daemon=True)
+    background.add_job(
+        retrain_scheduler.run_cycle,
+        'interval',
+        seconds=interval,
+        id='change_detection_retrain',
+        max_instances=1,
+        coalesce=True
+    )
+    background.start()
+
+    logger.info(f"Retraining scheduler started, checking every {interval}s")
+    return retrain_scheduler
+
+
+def start_snapshot_scheduler(snapshot_service) -> Optional[BackgroundScheduler]:
+    """
+    Periodically refresh the Parquet snapshots used by DATA_BACKEND=parquet
+
+    Runs every SNAPSHOT_INTERVAL seconds; an interval of 0 disables it.
+    """
+    interval = int(os.getenv('SNAPSHOT_INTERVAL', 3600))
+    if snapshot_service is None or interval <= 0:
+        return None
+
+    background = BackgroundScheduler(daemon=True)
+    background.add_job(
+        snapshot_service.snapshot,
+        'interval',
+        seconds=interval,
+        id='parquet_snapshot',
+        max_instances=1,
+        coalesce=True,
+        next_run_time=datetime.now()
+    )
+    background.start()
+
+    logger.info(f"Snapshot scheduler started, refreshing every {interval}s")
+    return background
+
+
+def start_lead_time_scheduler(lead_time_service) -> Optional[BackgroundScheduler]:
+    """
+    Periodically fold new purchase order receipts into the lead-time cache
+
+    Runs every LEAD_TIME_REFRESH_INTERVAL seconds; an interval of 0 disables it.
+    """
+    interval = int(os.getenv('LEAD_TIME_REFRESH_INTERVAL', 3600))
+    if lead_time_service is None or interval <= 0:
+        return None
+
+    background = BackgroundScheduler(daemon=True)
+    background.add_job(
+        lead_time_service.refresh,
+        'interval',
+        seconds=interval,
+        id='lead_time_refresh',
+        max_instances=1,
+        coalesce=True,
+        next_run_time=datetime.now()
+    )
+    background.start()
+
+    logger.info(f"Lead-time scheduler started, refreshing every {interval}s")
+    return background